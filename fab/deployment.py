@@ -1,4 +1,4 @@
-from fab.settings import token_repo  # MAINT
+from fab.settings import WORKERS, token_repo  # MAINT
 
 
 def pull(c):
@@ -41,12 +41,16 @@ def stop_all(c):
     # stop_gunicorn(c)
     # Gray uses supervisorctl NOT systemctl
     c.sudo(f"supervisorctl stop {c.app}")
+    for command in WORKERS:
+        c.sudo(f"supervisorctl stop {c.app}-{command}")
 
 
 def start_all(c):
     # start_gunicorn(c)
     # start_background(c)
     c.sudo(f"supervisorctl start {c.app}")
+    for command in WORKERS:
+        c.sudo(f"supervisorctl start {c.app}-{command}")
 
 
 # def stop_background(c):
@@ -1,7 +1,7 @@
 # Fabric2 support code to provision a new site
 # NB if moving to a new domain set ALLOWED HOSTS accordingly
 
-from fab.settings import green, blue
+from fab.settings import WORKERS, green, blue
 from fab.deployment import pull, put_env
 from fab.database import upload_database
 from fab.deployment import collect_static, migrate, start_all
@@ -66,6 +66,7 @@ def install_app(c):
     collect_static(c)
     migrate(c)
     configure_gunicorn(c)
+    configure_workers(c)
     # install_tasks(c)
     start_all(c)
     configure_nginx(c)
@@ -111,6 +112,31 @@ def configure_gunicorn(c):
     print(green("End config Gunicorn"))
 
 
+def configure_workers(c):
+    """
+    Email and photo ingestion are queued by the website and only done by
+    management commands running with --loop, which supervisor keeps running
+    next to gunicorn
+    """
+    print(blue("Start config workers"))
+    for command in WORKERS:
+        script = f"{c.app}/{command}_start"
+        c.run(
+            f"sed -e 's|XXapp|{c.app}|; s|XXsettings|{c.site}|; s|XXvenv|{c.venv}|; s|XXcommand|{command}|;' {c.app}/deployment/worker_start > {script}"
+        )
+        c.run(f"chmod u+x {script}")
+        # conf creation goes via temp file
+        template = f"{c.app}/deployment/worker.conf"
+        temp = f"{c.app}-{command}.conf"
+        output = f"/etc/supervisor/conf.d/{c.app}-{command}.conf"
+        c.run(
+            f"sed -e 's|XXapp|{c.app}|g; s|XXcommand|{command}|g;' {template} > {temp}"
+        )
+        c.sudo(f"mv {temp} {output}")
+        c.run(f"cd {c.app} && mkdir -p logs && touch logs/{command}.log")
+    print(green("End config workers"))
+
+
 def configure_nginx(c):
     # create a site file for nginx based on a standard template
     print(blue("Start configure Nginx"))
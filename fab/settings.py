@@ -14,6 +14,8 @@ HOST_FOLDER = "gray"
 # LOCAL_DEV_FOLDER = LOCAL_PATH + "/cwltc"
 # LOCAL_BACKUP_FOLDER = LOCAL_PATH + "/DatabaseBackups"
 # COMMAND_LIST = [("db_worker", True), ("overnight", False)]
+# Management commands run with --loop under supervisor, see deployment/worker.conf
+WORKERS = ["send_outbox", "ingest_photos"]
 # MAINT = "maintenance.html"
 # SANDBOX_TASK_LIST = ["sandbox", "db_worker_sandbox"]
 
@@ -166,8 +166,8 @@ MEDIA_URL = "/media/"
 LOGIN_URL = "wagtailadmin_login"
 LOGIN_REDIRECT_URL = "wagtailadmin_home"
 
-# Use pickle serializer so we can store Decimals and dates in sessions
-SESSION_SERIALIZER = "django.contrib.sessions.serializers.PickleSerializer"
+# JSON serializer that also handles Decimals and dates in sessions
+SESSION_SERIALIZER = "shop.serializers.SessionSerializer"
 
 # Wagtail settings
 WAGTAIL_SITE_NAME = "Guest and Gray"
@@ -234,6 +234,8 @@ EMAIL_USE_TLS = True
 EMAIL_PORT = 587
 EMAIL_HOST_USER = DJANGO_EMAIL  # "sitemail@chinese-porcelain-art.com"
 EMAIL_HOST_PASSWORD = env.str("SITEMAIL")
+# Outbound mail is queued and sent by the send_outbox command
+EMAIL_TIMEOUT = 30
 
 GOOGLE_RECAPTCHA_SECRET_KEY = env.str("CAPTCHA_SECRET")
 GOOGLE_RECAPTCHA_SITE_KEY = env.str("CAPTCHA_SITE")
@@ -1,7 +1,15 @@
 from django.contrib import admin
 from treebeard.admin import TreeAdmin
 from treebeard.forms import movenodeform_factory
-from shop.models import Category, Item, Contact, Enquiry, Purchase, Invoice
+from shop.models import (
+    Category,
+    Item,
+    Contact,
+    Enquiry,
+    Purchase,
+    Invoice,
+    OutboundEmail,
+)
 
 
 class CategoryAdmin(TreeAdmin):
@@ -14,3 +22,4 @@ admin.site.register(Contact)
 admin.site.register(Enquiry)
 admin.site.register(Purchase)
 admin.site.register(Invoice)
+admin.site.register(OutboundEmail)
@@ -0,0 +1,50 @@
+"""
+Version keys for data cached outside the wagtail page cache
+Cached entries include the current version in their key, so bumping a version
+invalidates every entry built from it in all processes that share the cache
+"""
+
+import time
+
+from django.core.cache import cache
+
+CATEGORY_TREE = "category_tree"
+GLOBAL_SETTINGS = "global_settings"
+ITEMS = "items"
+
+
+def get_version(name):
+    key = f"version:{name}"
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a lost key never reuses an old version
+        cache.add(key, int(time.time()), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name):
+    key = f"version:{name}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time()), timeout=None)
+
+
+def versioned_key(name, *parts):
+    return ":".join([name, str(get_version(name))] + [str(part) for part in parts])
+
+
+def item_key(item, authenticated):
+    """
+    Key for the cached public page of an item
+    Saving the item, the category tree or the global settings changes the key
+    """
+    return versioned_key(
+        CATEGORY_TREE,
+        "item",
+        item.ref,
+        item.updated.timestamp(),
+        get_version(GLOBAL_SETTINGS),
+        int(authenticated),
+    )
@@ -0,0 +1,116 @@
+"""
+Captcha verification for the enquiry and mail list forms
+The client keeps a pooled HTTP session with strict timeouts and records latency
+Set CAPTCHA_CLIENT = "shop.captcha.StubCaptchaClient" to test the forms offline
+"""
+
+import hashlib
+import logging
+import time
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+from shop.models import ContactOptions
+
+logger = logging.getLogger(__name__)
+
+PROVIDERS = {
+    ContactOptions.USE_HCAPTCHA: (
+        "https://hcaptcha.com/siteverify",
+        "HCAPTCHA_SECRET_KEY",
+        "h-captcha-response",
+    ),
+    ContactOptions.USE_RECAPTCHA: (
+        "https://www.google.com/recaptcha/api/siteverify",
+        "GOOGLE_RECAPTCHA_SECRET_KEY",
+        "g-recaptcha-response",
+    ),
+}
+
+
+def response_field(option):
+    """Name of the POST field that holds the token for this captcha option"""
+    return PROVIDERS[option][2]
+
+
+class CaptchaClient:
+    """Verify captcha tokens with the provider"""
+
+    # (connect, read) seconds
+    timeout = getattr(settings, "CAPTCHA_TIMEOUT", (3.05, 5))
+    # A verified token is remembered so a double submission is not re-verified
+    memo_seconds = getattr(settings, "CAPTCHA_MEMO_SECONDS", 120)
+
+    def __init__(self):
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=4, max_retries=0))
+        self.metrics = {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0}
+
+    def verify(self, option, token, remote_ip=None):
+        if not token:
+            return False
+        key = "captcha:" + hashlib.sha256(token.encode()).hexdigest()
+        if cache.get(key):
+            return True
+        start = time.monotonic()
+        try:
+            success = self.check(option, token, remote_ip)
+        except (requests.RequestException, ValueError) as e:
+            self.metrics["errors"] += 1
+            logger.warning(f"Captcha verification failed: {e}")
+            success = False
+        self.record(option, (time.monotonic() - start) * 1000, success)
+        if success:
+            cache.set(key, True, self.memo_seconds)
+        return success
+
+    def check(self, option, token, remote_ip):
+        url, secret, _ = PROVIDERS[option]
+        values = {"secret": getattr(settings, secret), "response": token}
+        if remote_ip:
+            values["remoteip"] = remote_ip
+        response = self.session.post(url, values, timeout=self.timeout)
+        response.raise_for_status()
+        success = response.json().get("success")
+        if success is None:
+            # An error body, such as for a bad secret, fails like a timeout
+            raise ValueError(f"No result in captcha response: {response.text}")
+        return success
+
+    def record(self, option, ms, success):
+        self.metrics["calls"] += 1
+        self.metrics["total_ms"] += ms
+        self.metrics["max_ms"] = max(self.metrics["max_ms"], ms)
+        logger.info(
+            f"Captcha {ContactOptions(option).name} {ms:.0f}ms success={success}"
+        )
+
+
+class StubCaptchaClient(CaptchaClient):
+    """
+    Offline client for development and load tests
+    Any token except "fail" is accepted after CAPTCHA_STUB_DELAY seconds
+    """
+
+    delay = getattr(settings, "CAPTCHA_STUB_DELAY", 0)
+
+    def check(self, option, token, remote_ip):
+        if self.delay:
+            time.sleep(self.delay)
+        return token != "fail"
+
+
+_client = None
+
+
+def get_client():
+    """The process wide client, so its HTTP connection pool is reused"""
+    global _client
+    if _client is None:
+        path = getattr(settings, "CAPTCHA_CLIENT", "shop.captcha.CaptchaClient")
+        _client = import_string(path)()
+    return _client
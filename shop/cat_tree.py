@@ -5,9 +5,13 @@ See https://django-treebeard.readthedocs.io/en/latest/api.html
 """
 
 import json
-from shop.models import Category
+from collections import defaultdict
+from django.core.cache import cache
 from django.shortcuts import reverse
 from django.db import transaction
+from django.utils.text import slugify
+from shop.cache import CATEGORY_TREE, bump_version, versioned_key
+from shop.models import Category, Item
 
 
 @transaction.atomic
@@ -18,6 +22,7 @@ def tree_move(node_id, target_id, previous_id, inside):
     """
     node = Category.objects.get(id=node_id)
     target = Category.objects.get(id=target_id)
+    Category.objects.adjust_counts(node.subtree_changes(-1))
     if inside:
         # If inside, add as first node of the target
         # Renumber target's children from 2 and insert node in pos 1
@@ -56,11 +61,32 @@ def tree_move(node_id, target_id, previous_id, inside):
                     child.save()
             target = Category.objects.get(id=target.id)
             node.move(target, "sorted-sibling")
+    # Refresh slugs, ancestors and seo_prefix below the new parent
+    node = Category.objects.get(id=node_id)
+    node.update_slugs()
+    Category.objects.adjust_counts(node.subtree_changes(1))
+    bump_version(CATEGORY_TREE)
 
 
 def tree(admin=False, archive=False, root="Catalogue"):
     """
     Create a dictionary representation of the Category tree
+    The public menu trees are cached until the tree version is bumped
+    """
+    if admin:
+        return build_tree(admin, archive, root)
+    key = versioned_key(CATEGORY_TREE, slugify(root), archive)
+    result = cache.get(key)
+    if result is None:
+        result = build_tree(admin, archive, root)
+        cache.set(key, result)
+    return result
+
+
+def build_tree(admin, archive, root):
+    """
+    Build the tree from a single query over the materialised path
+    The admin tree gets all item counts from one more aggregate query
     """
     try:
         node = Category.objects.get(name=root)
@@ -69,11 +95,16 @@ def tree(admin=False, archive=False, root="Catalogue"):
 
     if node.sequence == 0:
         sequence_tree()
-    dict = node_dict(node, admin, archive)
-    kids = descend(node, admin, archive)
-    if kids:
-        dict["children"] = kids
-    return dict
+    children = defaultdict(list)
+    for descendant in Category.get_tree(node):
+        if descendant.depth > node.depth:
+            children[descendant.path[: -Category.steplen]].append(descendant)
+    counts = None
+    if admin:
+        counts = Item.objects.filter(
+            category__path__startswith=node.path
+        ).counts_by_category()
+    return assemble(node, children, admin, archive, counts)
 
 
 def tree_json():
@@ -81,8 +112,11 @@ def tree_json():
     return "[" + json.dumps(tree(admin=True)) + "]"
 
 
-def node_dict(node, admin, archive):
-    """Define content of a tree node in the dictionary"""
+def node_dict(node, admin, archive, counts=None):
+    """
+    Define content of a tree node in the dictionary
+    counts maps category id to shop and archive counts for the admin tree
+    """
     dict = {"id": node.id}
     if admin:
         link = (
@@ -101,8 +135,7 @@ def node_dict(node, admin, archive):
         dict["archive"] = archive
         return dict
     # admin only code
-    shop = node.shop_count()
-    archive = node.archive_count()
+    shop, archive = counts.get(node.id, (0, 0))
     items = shop + archive
     dict["shop"] = 1
     dict["archive"] = archive
@@ -112,8 +145,8 @@ def node_dict(node, admin, archive):
         if items > 0
         else f""
     )
-    btn = "btn-outline-info" if node.is_leaf() else "btn-outline-primary"
-    if not node.is_leaf() and items > 0:
+    btn = "btn-outline-info" if dict["leaf"] else "btn-outline-primary"
+    if not dict["leaf"] and items > 0:
         count_text = f'<span class="text-danger">{count_text}</span>'
     dict[
         "name"
@@ -121,19 +154,15 @@ def node_dict(node, admin, archive):
     return dict
 
 
-def descend(parent, admin, archive):
-    """Recursively expand the tree"""
-    children = parent.get_children().order_by("sequence", "name")
-    if children:
-        kids = []
-        for node in children:
-            dict = node_dict(node, admin, archive)
-            next_gen = descend(node, admin, archive)
-            if next_gen:
-                dict["children"] = next_gen
-            kids.append(dict)
-        return kids
-    return None
+def assemble(node, children, admin, archive, counts=None):
+    """Recursively expand the tree from the in-memory map of path to children"""
+    dict = node_dict(node, admin, archive, counts)
+    kids = sorted(children.get(node.path, []), key=lambda kid: (kid.sequence, kid.name))
+    if kids:
+        dict["children"] = [
+            assemble(kid, children, admin, archive, counts) for kid in kids
+        ]
+    return dict
 
 
 def sequence_tree():
@@ -168,41 +197,3 @@ def print_kids(node, level):
     print(sp, node.name, node.sequence)
     for kid in node.get_children().order_by("sequence"):
         print_kids(kid, level + 1)
-
-
-class Counter:
-    """Traverse a hierarchical category tree and append the total count of items under each node"""
-
-    def __init__(
-        self, root, archive=False, exclude_no_image=True, exclude_not_visible=True
-    ):
-        self.total = 0
-        self.root = root
-        self.archive = archive
-        self.no_image = exclude_no_image
-        self.not_visible = exclude_not_visible
-
-    def count(self):
-        print("-------------------------", self.archive)
-        return self._count(self.root)
-
-    def _count(self, cat):
-        # recursive count function
-        items = cat.item_set.filter(archive=self.archive)
-        if self.no_image:
-            items = items.filter(image__isnull=False)
-        if self.not_visible:
-            items = items.filter(visible=True)
-        total = items.count()
-        child_cats = cat.get_children()
-        # if self.no_image:
-        #     child_cats = child_cats.filter(image__isnull=False)
-        # if self.not_visible:
-        #     child_cats = child_cats.filter(visible=True)
-        if child_cats:
-            for cat1 in child_cats:
-                total += self._count(cat1)
-        cat.count = total
-        cat.save()
-        print(f"{cat.name} {cat.count}")
-        return total
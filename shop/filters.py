@@ -7,8 +7,8 @@ from django_filters import (
     BooleanFilter,
 )
 from tempus_dominus.widgets import DatePicker
-from django.contrib.postgres.search import SearchVector
 from shop.models import Category, Compiler, Item, Contact
+from shop.search import filter_items
 
 
 # noinspection PyUnusedLocal
@@ -18,6 +18,7 @@ class ItemFilter(FilterSet):
         fields = ["ref", "category"]
 
     name = CharFilter(field_name="name", lookup_expr="icontains")
+    search = CharFilter(method="search_filter", label="Search")
     category = ChoiceFilter(
         field_name="category",
         label="Category",
@@ -57,7 +58,6 @@ class ItemFilter(FilterSet):
     #     ),
     #     method="image_filter",
     # )
-    # search = CharFilter(method="search_filter", label="Search")
     # # per_page = PaginationFilter()
 
     def __init__(self, *args, **kwargs):
@@ -69,12 +69,10 @@ class ItemFilter(FilterSet):
 
     @staticmethod
     def search_filter(queryset, name, value):
-        # https://django.cowhite.com/blog/mastering-search-in-django-postgres/
+        """Full text search on name, ref, description and provenance"""
         if not value:
             return queryset
-        return queryset.annotate(
-            search=SearchVector("name", "ref"),
-        ).filter(search=value)
+        return filter_items(value, queryset)
 
     @staticmethod
     def cat_filter(queryset, name, value):
@@ -175,7 +175,7 @@ class CartPriceForm(ModelForm):
         fields = ("sale_price", "agreed_price")
 
     sale_price = forms.DecimalField(max_digits=8, decimal_places=2, required=False)
-    # agreed_price is just used stored temporarily in the session instance
+    # agreed_price is stored on the cart line, not on the item
     agreed_price = forms.DecimalField(max_digits=8, decimal_places=2, required=True)
 
     def clean_sale_price(self):
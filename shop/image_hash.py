@@ -0,0 +1,96 @@
+"""
+Content hashes of image files
+file_hash is the SHA-1 of the bytes, as Wagtail stores it, and finds exact
+duplicates. phash is a 64 bit difference hash of the picture, which changes
+in only a few bits when an image is re-encoded, resized or slightly edited.
+"""
+
+import hashlib
+
+from PIL import Image
+
+# Hashes that differ in at most this many bits are reported as similar
+SIMILAR_BITS = 6
+# Hashes are indexed by BANDS equal slices. Two hashes within BANDS - 1 bits
+# must match exactly in at least one slice, so that is the most bits the
+# index can find.
+BANDS = 8
+MAX_BITS = BANDS - 1
+WIDTH = 64 // BANDS
+
+
+def file_hash(path):
+    hasher = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def perceptual_hash(path):
+    """Difference hash of a 9x8 greyscale thumbnail as 16 hex digits"""
+    with Image.open(path) as im:
+        im.draft("L", (72, 64))
+        pixels = list(im.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            bits = bits << 1 | (left > pixels[row * 9 + col + 1])
+    return f"{bits:016x}"
+
+
+def image_hashes(path):
+    return file_hash(path), perceptual_hash(path)
+
+
+def distance(phash, other):
+    return bin(int(phash, 16) ^ int(other, 16)).count("1")
+
+
+def check_bits(bits):
+    if not 0 <= bits <= MAX_BITS:
+        raise ValueError(f"bits must be between 0 and {MAX_BITS}")
+
+
+def band_keys(phash):
+    """One key for each band: the band number and the hash's slice in it"""
+    value = int(phash, 16)
+    mask = (1 << WIDTH) - 1
+    return [band << WIDTH | value >> (band * WIDTH) & mask for band in range(BANDS)]
+
+
+def band_index(entries):
+    """Map each band key to the (phash, value) entries that have it"""
+    index = {}
+    for phash, value in entries:
+        if phash:
+            for key in band_keys(phash):
+                index.setdefault(key, []).append((phash, value))
+    return index
+
+
+def similar(phash, index, bits=SIMILAR_BITS):
+    """The (phash, value) entries of a band_index within bits of phash"""
+    check_bits(bits)
+    found = {}
+    for key in band_keys(phash):
+        for entry in index.get(key, []):
+            if entry not in found and distance(phash, entry[0]) <= bits:
+                found[entry] = True
+    return list(found)
+
+
+def similar_pairs(hashes, bits=SIMILAR_BITS):
+    """
+    Pairs of (id, phash) entries within bits of each other
+    Only entries that share a slice in the band index are compared
+    """
+    check_bits(bits)
+    pairs = set()
+    for bucket in band_index((phash, id) for id, phash in hashes).values():
+        for i, (phash, id) in enumerate(bucket):
+            for other, other_id in bucket[i + 1 :]:
+                if distance(phash, other) <= bits:
+                    pairs.add((min(id, other_id), max(id, other_id)))
+    return sorted(pairs)
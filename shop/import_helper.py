@@ -6,6 +6,7 @@ from import_export import resources
 from import_export.fields import Field
 from tablib import Dataset
 
+from .image_hash import file_hash
 from .models import Item, Category, CustomImage
 
 logger = logging.getLogger(__name__)
@@ -149,13 +150,20 @@ def load_image(item, user, collection=None):
                 loaded = True
             del response
         if loaded:
-            new_image = CustomImage.objects.create(
-                file="original_images/" + file_name,
-                title=item.name,
-                collection_id=collection_id,
-                uploaded_by_user=user,
-                item=item,
-            )
+            # Loading the same picture again reuses the existing image
+            content_hash = file_hash(media_path)
+            new_image = CustomImage.objects.filter(
+                item=item, file_hash=content_hash
+            ).first()
+            if not new_image:
+                new_image = CustomImage.objects.create(
+                    file="original_images/" + file_name,
+                    title=item.name,
+                    collection_id=collection_id,
+                    uploaded_by_user=user,
+                    item=item,
+                    file_hash=content_hash,
+                )
             item.image = new_image
             item.save()
             return True
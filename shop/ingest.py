@@ -0,0 +1,266 @@
+"""
+Batch ingestion of uploaded photos as item images
+The images page queues an IngestJob and the ingest_photos command runs it,
+outside the web process. Photos are decoded and resized in a process pool to
+temporary files, duplicates are dropped, the kept files moved to free names in
+original_images, the CustomImage rows bulk created and the standard renditions
+generated before the photos are deleted. Progress is saved on the job so the
+images page can poll it, and a job abandoned by a dead worker is run again.
+"""
+
+import logging
+import math
+import os
+from multiprocessing import Pool
+
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils.timezone import now
+from wagtail.models import Collection
+from wagtail.search.index import insert_or_update_object
+
+from shop import renditions
+from shop.image_hash import band_index, band_keys, image_hashes, similar
+from shop.models import CustomImage, ImageBand, IngestJob, Item, Photo
+
+logger = logging.getLogger(__name__)
+
+WORKERS = min(4, os.cpu_count() or 1)
+ORIENTATION = 0x0112
+
+
+def geometry(width, height, crop, limit):
+    """
+    Region of an upright image to keep and the size to scale it to
+    A nearly square image is cropped to a square of its smaller dimension
+    """
+    short, long = min(width, height), max(width, height)
+    if crop and width != height and (long - short) / long < 0.09:
+        left, top = (width - short) // 2, (height - short) // 2
+        side = min(short, limit) if limit > 0 else short
+        return (left, top, left + short, top + short), (side, side)
+    box = (0, 0, width, height)
+    if width == height:
+        side = limit if 0 < limit < width else width
+        return box, (side, side)
+    # The longer side is reduced to the shorter side, or to limit if smaller
+    side = min(short, limit) if limit > 0 else short
+    other = max(1, round(side * short / long))
+    return box, (side, other) if width > height else (other, side)
+
+
+def resize(im, crop, limit):
+    """
+    Resize image to limit if limit > 0
+    if crop_square, and height and width are within 9 % crop to smaller dimension
+    im must not be loaded yet: a JPEG is decoded at the smallest scale that
+    still covers the output, and the EXIF orientation is applied
+    """
+    orientation = im.getexif().get(ORIENTATION, 1)
+    turned = orientation in (5, 6, 7, 8)
+    width, height = (im.height, im.width) if turned else im.size
+    box, size = geometry(width, height, crop, limit)
+    scale = size[0] / (box[2] - box[0])
+    if scale < 1:
+        im.draft(im.mode, (math.ceil(im.width * scale), math.ceil(im.height * scale)))
+    if orientation != 1:
+        im = ImageOps.exif_transpose(im)
+    factor = im.width / width
+    box = tuple(edge * factor for edge in box)
+    if box == (0, 0, *im.size) and size == im.size:
+        return im
+    return im.resize(size, Image.LANCZOS, box=box, reducing_gap=3.0)
+
+
+def prepare_photo(args):
+    """
+    Resize one photo and save it to dest, a temporary name
+    Runs in a worker process; returns (dest, width, height, file_hash, phash)
+    """
+    source, dest, crop, limit = args
+    path = os.path.join(settings.MEDIA_ROOT, dest)
+    with Image.open(source) as image:
+        im = resize(image, crop, limit)
+        im.save(path, optimize=True, progressive=True, quality=70)
+    return (dest, im.width, im.height, *image_hashes(path))
+
+
+def temp_name(photo):
+    """Where a worker writes the resized photo; unique as photo ids are"""
+    return os.path.join("photos", "ingest", f"{photo.id}.jpg")
+
+
+def queue_ingestion(item, user, crop, limit):
+    return IngestJob.objects.create(item=item, user=user, crop=crop, limit=limit)
+
+
+def get_progress(user, item):
+    """The latest ingestion job of user for item"""
+    return IngestJob.objects.filter(user=user, item=item).order_by("-id").first()
+
+
+def set_progress(job, stage, done, total):
+    job.stage = stage
+    job.done = done
+    job.total = total
+    # Saving updated also shows the worker is alive
+    job.save(update_fields=["stage", "done", "total", "updated"])
+
+
+def is_running(user):
+    """True if an ingestion for any item is queued or in progress for this user"""
+    return IngestJob.objects.filter(user=user, finished__isnull=True).exists()
+
+
+def clear_photos(user):
+    """Delete the photos uploaded by a user, their files and resized copies"""
+    photos = Photo.objects.filter(user=user)
+    for photo in photos:
+        photo.file.delete(save=False)
+        default_storage.delete(temp_name(photo))
+    photos.delete()
+
+
+def sort_duplicates(photos, results):
+    """
+    Drop the results that duplicate an existing image, or an earlier photo,
+    and their files. Return the rest and a report of what was skipped and of
+    existing images that look similar.
+    """
+    known = {
+        image.file_hash: f"{image.title} (image {image.id})"
+        for image in CustomImage.objects.filter(
+            file_hash__in=[result[3] for result in results]
+        )
+    }
+    # Only images sharing a band key with a new photo can be similar
+    keys = {key for result in results for key in band_keys(result[4])}
+    index = band_index(
+        CustomImage.objects.filter(bands__key__in=keys)
+        .distinct()
+        .values_list("phash", "title")
+    )
+    fresh = []
+    report = []
+    for photo, result in zip(photos, results):
+        dest, width, height, file_hash, phash = result
+        if file_hash in known:
+            report.append(
+                f"{photo.title} was skipped, it is the same as {known[file_hash]}"
+            )
+            default_storage.delete(dest)
+            continue
+        known[file_hash] = photo.title
+        titles = sorted({title for _, title in similar(phash, index)})
+        if titles:
+            report.append(f"{photo.title} looks like {', '.join(titles[:5])}")
+        fresh.append((photo, result))
+    return fresh, report
+
+
+def move_into_place(photo, temp):
+    """Move a resized photo to a free name in original_images"""
+    name = default_storage.get_available_name(
+        os.path.join("original_images", photo.title)
+    )
+    os.replace(default_storage.path(temp), default_storage.path(name))
+    return name
+
+
+def ingest_photos(job, workers=WORKERS):
+    """
+    Turn the photos uploaded by the job's user into images of its item
+    Exact duplicates are skipped; see sort_duplicates
+    Returns the list of new images
+    """
+    item = job.item
+    photos = list(Photo.objects.filter(user=job.user).order_by("uploaded_at", "id"))
+    total = len(photos)
+    os.makedirs(default_storage.path(os.path.join("photos", "ingest")), exist_ok=True)
+    jobs = [
+        (photo.file.path, temp_name(photo), job.crop, job.limit) for photo in photos
+    ]
+    set_progress(job, "Resizing", 0, total)
+    results = []
+    if workers > 1 and total > 1:
+        # Workers only resize files. Close the connections first so they do
+        # not inherit them; this process reconnects on its next query.
+        connections.close_all()
+        with Pool(min(workers, total)) as pool:
+            for result in pool.imap(prepare_photo, jobs):
+                results.append(result)
+                set_progress(job, "Resizing", len(results), total)
+    else:
+        for args in jobs:
+            results.append(prepare_photo(args))
+            set_progress(job, "Resizing", len(results), total)
+
+    results, report = sort_duplicates(photos, results)
+    collection = Collection.objects.filter(name="Shop images").first()
+    checked = now()
+    images = CustomImage.objects.bulk_create(
+        CustomImage(
+            file=move_into_place(photo, temp),
+            width=width,
+            height=height,
+            title=f"{item.ref} {item.name}",
+            collection=collection or Collection.get_first_root_node(),
+            uploaded_by_user=job.user,
+            item=item,
+            file_ok=True,
+            file_checked=checked,
+            file_hash=file_hash,
+            phash=phash,
+        )
+        for photo, (temp, width, height, file_hash, phash) in results
+    )
+    ImageBand.store(images)
+    # bulk_create sends no post_save, so do what the signal handlers would
+    Item.objects.filter(pk=item.pk).update(updated=now())
+
+    for i, image in enumerate(images):
+        set_progress(job, "Renditions", i, len(images))
+        insert_or_update_object(image)
+        image.get_renditions(*renditions.all_specs())
+    clear_photos(job.user)
+    job.stage, job.done, job.total = "Done", 1, 1
+    job.report = report
+    job.finished = now()
+    job.save(update_fields=["stage", "done", "total", "report", "finished", "updated"])
+    return images
+
+
+def claim_job():
+    """
+    Mark the next pending job as started and return it, or None
+    Rows are locked while claiming so several workers never run the same job
+    """
+    with transaction.atomic():
+        jobs = IngestJob.pending()
+        if connections["default"].features.has_select_for_update_skip_locked:
+            jobs = jobs.select_for_update(skip_locked=True)
+        job = jobs.first()
+        if job is None:
+            return None
+        job.started = now()
+        job.attempts += 1
+        job.save(update_fields=["started", "attempts", "updated"])
+    return job
+
+
+def run_job(job, workers=WORKERS):
+    """Run a claimed job, recording a failure on it"""
+    if job.attempts > IngestJob.MAX_ATTEMPTS:
+        job.error = "The job was abandoned too many times"
+    else:
+        try:
+            ingest_photos(job, workers)
+            return
+        except Exception as e:
+            logger.exception("Image ingestion failed for item %s", job.item_id)
+            job.error = str(e)
+    job.finished = now()
+    job.stage = "Failed"
+    job.save(update_fields=["error", "finished", "stage", "updated"])
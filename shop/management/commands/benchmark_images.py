@@ -0,0 +1,135 @@
+import os
+import resource
+import shutil
+import tempfile
+import time
+from multiprocessing import Pool
+
+from PIL import Image
+from django.core.management.base import BaseCommand
+from resizeimage import resizeimage
+
+from shop.ingest import resize
+
+# Camera sized fixtures: (width, height, EXIF orientation)
+FIXTURES = [
+    (6000, 4000, 1),
+    (4000, 6000, 1),
+    (6000, 4000, 6),
+    (4000, 3800, 1),
+    (3000, 3000, 1),
+]
+
+
+def legacy_resize(im, crop, limit):
+    """The resizeimage implementation used before draft decoding"""
+    width = im.width
+    height = im.height
+    if width == height:
+        size = width
+        if 0 < limit < width:
+            size = limit
+            im = resizeimage.resize_width(im, size)
+    elif width > height:
+        size = height
+        if 0 < limit < height:
+            size = limit
+        if crop and (width - height) / width < 0.09:
+            im = resizeimage.resize_crop(im, [size, size])
+        else:
+            im = resizeimage.resize_width(im, size)
+    elif height > width:
+        size = width
+        if limit and width > limit:
+            size = limit
+        if crop and (height - width) / height < 0.09:
+            im = resizeimage.resize_crop(im, [size, size])
+        else:
+            im = resizeimage.resize_height(im, size)
+    return im
+
+
+def legacy_save(source, dest, crop, limit):
+    with open(source, "r+b") as f:
+        with Image.open(f) as image:
+            im = legacy_resize(image, crop, limit)
+            im.save(dest, optimize=True, quality=70)
+
+
+def draft_save(source, dest, crop, limit):
+    with Image.open(source) as image:
+        im = resize(image, crop, limit)
+        im.save(dest, optimize=True, progressive=True, quality=70)
+
+
+IMPLEMENTATIONS = {"legacy": legacy_save, "draft": draft_save}
+
+
+def measure(args):
+    """
+    Run in a fresh worker process so that peak RSS belongs to one image
+    Returns (seconds, growth of peak RSS in MB)
+    """
+    name, source, dest, crop, limit = args
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    IMPLEMENTATIONS[name](source, dest, crop, limit)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return elapsed, (peak - before) / 1024
+
+
+class Command(BaseCommand):
+    """
+    Compare time and peak memory per image of the legacy resizeimage path and
+    the draft decoding resize on a generated set of camera sized JPEGs
+    """
+
+    help = "Benchmark photo resizing for image uploads"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=3000)
+        parser.add_argument("--no-crop", action="store_true")
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        crop = not options["no_crop"]
+        limit = options["limit"]
+        folder = tempfile.mkdtemp()
+        try:
+            sources = self.make_fixtures(folder)
+            self.stdout.write(f"limit {limit}, crop {crop}")
+            for name in IMPLEMENTATIONS:
+                self.run(name, sources, folder, crop, limit, options["repeat"])
+        finally:
+            shutil.rmtree(folder)
+
+    def make_fixtures(self, folder):
+        """Noisy JPEGs compress like photographs, unlike flat colour"""
+        sources = []
+        for width, height, orientation in FIXTURES:
+            path = os.path.join(folder, f"{width}x{height}-{orientation}.jpg")
+            image = Image.effect_noise((width, height), 64).convert("RGB")
+            exif = Image.Exif()
+            exif[0x0112] = orientation
+            image.save(path, quality=90, exif=exif)
+            sources.append(path)
+        return sources
+
+    def run(self, name, sources, folder, crop, limit, repeat):
+        self.stdout.write(self.style.SUCCESS(name))
+        jobs = [
+            (name, source, os.path.join(folder, f"{name}.jpg"), crop, limit)
+            for source in sources
+        ]
+        # One task per child so each measurement starts from a clean process
+        with Pool(1, maxtasksperchild=1) as pool:
+            for job in jobs:
+                results = pool.map(measure, [job] * repeat, chunksize=1)
+                seconds = min(elapsed for elapsed, _ in results)
+                memory = max(rss for _, rss in results)
+                size = Image.open(job[2]).size
+                self.stdout.write(
+                    f"  {os.path.basename(job[1]):<16} -> {size[0]}x{size[1]:<6}"
+                    f"{seconds * 1000:8.0f} ms {memory:8.1f} MB"
+                )
@@ -0,0 +1,166 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from wagtail.models import Collection
+
+from shop.cache import bump_version
+from shop.models import GRID_KEYSET, Category, CustomImage, Item
+from shop.pagination import KeysetPaginator
+
+# Page boundaries of the seeded items are cached under their own version,
+# apart from the site's ITEMS keys
+BENCHMARK_ITEMS = "benchmark_items"
+
+# Indexes added for the item grids (0057) and the staff item table (0058)
+INDEXES = [
+    "shop_item_grid_keyset",
+    "item_library_ref",
+    "item_state_ref",
+    "item_archive_ref",
+    "item_category_ref",
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """
+    Time the public grid and staff item table queries with and without the
+    item indexes. Everything, including dropping the indexes, happens inside
+    a transaction that is rolled back.
+    """
+
+    help = "Report query plans and timings for item lists against a seeded catalogue"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed", type=int, default=50000, help="Number of items to create"
+        )
+        parser.add_argument("--categories", type=int, default=20)
+        parser.add_argument("--per-page", type=int, default=24)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--no-plans", action="store_true", help="Only report timings"
+        )
+
+    def handle(self, *args, **options):
+        self.per_page = options["per_page"]
+        self.repeat = options["repeat"]
+        self.plans = not options["no_plans"]
+        try:
+            with transaction.atomic():
+                category = self.seed(options["seed"], options["categories"])
+                self.stdout.write(self.style.SUCCESS("With indexes"))
+                self.run(category)
+                if connection.vendor != "postgresql":
+                    # SQLite keeps using cached plans after the indexes are dropped
+                    self.stdout.write("Comparison without indexes needs PostgreSQL")
+                    raise Rollback
+                self.drop_indexes()
+                self.stdout.write(self.style.SUCCESS("Without indexes"))
+                self.run(category)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count, categories):
+        start = time.monotonic()
+        if not Collection.get_first_root_node():
+            Collection.add_root(name="Root")
+        image = CustomImage.objects.create(
+            title="Benchmark", file="original_images/benchmark.jpg", width=1, height=1
+        )
+        root = Category.add_root(name="Benchmark")
+        leaves = [root.add_child(name=f"Benchmark {i}") for i in range(categories)]
+        libraries = [Item.Library.STOCK, Item.Library.STOCK, Item.Library.ARCHIVE]
+        items = [
+            Item(
+                name=f"Item {i}",
+                ref=f"B{i:06d}",
+                slug=f"item-{i}",
+                category=random.choice(leaves),
+                library=random.choice(libraries),
+                state=random.choice(list(Item.State)),
+                archive=random.random() < 0.3,
+                visible=random.random() < 0.9,
+                image=image if random.random() < 0.8 else None,
+                featured=random.random() < 0.02,
+                rank=random.randint(0, 5),
+                sale_price=random.randint(1, 500) * 10
+                if random.random() < 0.9
+                else None,
+            )
+            for i in range(count)
+        ]
+        Item.objects.bulk_create(items, batch_size=1000)
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE shop_item")
+        self.stdout.write(
+            f"Seeded {count} items in {time.monotonic() - start:.1f}s, "
+            f"{Item.objects.count()} in total"
+        )
+        return leaves[0]
+
+    def drop_indexes(self):
+        with connection.cursor() as cursor:
+            for name in INDEXES:
+                cursor.execute(f"DROP INDEX IF EXISTS {name}")
+
+    def run(self, category):
+        grid = category.shop_items()
+        count = grid.count()
+        deep = max(count // self.per_page, 1)
+        # bulk_create sends no signals, so start from a fresh version
+        bump_version(BENCHMARK_ITEMS)
+        keyset = KeysetPaginator(
+            grid, self.per_page, GRID_KEYSET, count, "grid", BENCHMARK_ITEMS
+        )
+        offset = Paginator(grid, self.per_page)
+        # Fill the boundary cache so only the page query is timed
+        keyset.boundaries()
+        cases = [
+            ("Shop grid page 1", grid[: self.per_page]),
+            (f"Shop grid page {deep} offset", offset.page(deep).object_list),
+            (f"Shop grid page {deep} keyset", keyset.page(deep).object_list),
+            ("Archive grid page 1", category.archive_items()[: self.per_page]),
+            (
+                "Staff table by library",
+                Item.objects.filter(library=Item.Library.ARCHIVE).order_by("ref"),
+            ),
+            (
+                "Staff table by state",
+                Item.objects.filter(state=Item.State.SOLD).order_by("ref"),
+            ),
+            (
+                "Staff table archive",
+                Item.objects.filter(archive=True).order_by("ref"),
+            ),
+            (
+                "Staff table by category",
+                Item.objects.filter(category=category).order_by("ref"),
+            ),
+        ]
+        for label, queryset in cases:
+            if label.startswith("Staff"):
+                queryset = queryset[: self.per_page]
+            self.time(label, queryset)
+
+    def time(self, label, queryset):
+        best = None
+        for _ in range(self.repeat):
+            start = time.monotonic()
+            list(queryset.all())
+            elapsed = (time.monotonic() - start) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        self.stdout.write(f"{label}: {best:.1f}ms")
+        if self.plans:
+            if connection.vendor == "postgresql":
+                self.stdout.write(queryset.all().explain(analyze=True))
+            else:
+                self.stdout.write(queryset.all().explain())
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test.utils import CaptureQueriesContext
+
+from shop.cache import CATEGORY_TREE, bump_version
+from shop.models import Category
+
+
+class Command(BaseCommand):
+    """
+    Render the catalogue and archive mega-menus and report the queries used
+    The first pass runs against a freshly invalidated tree cache, the second is warm
+    """
+
+    help = "Report query counts for rendering the mega-menu"
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{Category.objects.count()} categories")
+        bump_version(CATEGORY_TREE)
+        for label in ("Cold cache", "Warm cache"):
+            with CaptureQueriesContext(connection) as queries:
+                render_to_string(
+                    "shop/includes/catalogue_menu.html",
+                    {"is_catalogue": True, "is_archive": False},
+                )
+                render_to_string(
+                    "shop/includes/catalogue_menu.html",
+                    {"is_catalogue": False, "is_archive": True},
+                )
+            self.stdout.write(f"{label}: {len(queries)} queries")
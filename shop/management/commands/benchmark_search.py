@@ -0,0 +1,89 @@
+import random
+import time
+from itertools import chain
+
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from wagtail.models import Page
+from wagtail.search.backends import get_search_backend
+
+from shop.models import Item
+from shop.search import GROUPS, ChainedResults, search_items
+
+WORDS = ["bowl", "vase", "dish", "jar", "cup", "plate", "ewer", "figure", "box"]
+STYLES = ["famille rose", "blue and white", "celadon", "imari", "kraak", "export"]
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """
+    Compare the old four-way search fan-out with the single ranked search
+    Seeded items are created inside a transaction that is rolled back
+    """
+
+    help = "Time public search against a seeded catalogue"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed", type=int, default=50000, help="Number of items to create"
+        )
+        parser.add_argument("--query", default="famille rose bowl")
+        parser.add_argument("--per-page", type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.seed(options["seed"])
+                self.run(options["query"], options["per_page"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count):
+        start = time.monotonic()
+        items = [
+            Item(
+                name=f"{random.choice(STYLES)} {random.choice(WORDS)} {i}",
+                ref=f"B{i}",
+                archive=random.random() < 0.5,
+                visible=True,
+            )
+            for i in range(count)
+        ]
+        items = Item.objects.bulk_create(items, batch_size=1000)
+        get_search_backend().add_bulk(Item, items)
+        self.stdout.write(
+            f"Seeded {count} items in {time.monotonic() - start:.1f}s, "
+            f"{Item.objects.count()} in total"
+        )
+
+    def run(self, query, per_page):
+        backend = get_search_backend()
+        items = Item.objects.filter(visible=True)
+
+        def fanout():
+            results = [backend.search(query, items.filter(**group)) for group in GROUPS]
+            return list(chain(*results, backend.search(query, Page)))
+
+        def ranked():
+            return ChainedResults(
+                search_items(query, items), backend.search(query, Page)
+            )
+
+        for label, search in (("Fan-out", fanout), ("Ranked", ranked)):
+            for number in (1, 50):
+                start = time.monotonic()
+                with CaptureQueriesContext(connection) as queries:
+                    paginator = Paginator(search(), per_page)
+                    page = paginator.page(min(number, paginator.num_pages))
+                    list(page.object_list)
+                elapsed = (time.monotonic() - start) * 1000
+                self.stdout.write(
+                    f"{label} page {page.number} of {paginator.num_pages}: "
+                    f"{elapsed:.0f}ms, {len(queries)} queries"
+                )
@@ -0,0 +1,120 @@
+import os
+import time
+from multiprocessing import Pool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from shop.image_hash import MAX_BITS, SIMILAR_BITS, image_hashes, similar_pairs
+from shop.models import CustomImage, ImageBand
+
+
+def hash_batch(batch):
+    """
+    Hash the files of a batch of (id, file name) pairs
+    Returns a list of (id, file_hash, phash) and a list of (id, error)
+    """
+    hashes = []
+    errors = []
+    for id, name in batch:
+        try:
+            hashes.append((id, *image_hashes(os.path.join(settings.MEDIA_ROOT, name))))
+        except OSError as e:
+            errors.append((id, str(e)))
+    return hashes, errors
+
+
+class Command(BaseCommand):
+    """
+    Store the content and perceptual hashes of existing images, optionally in
+    parallel worker processes, and report duplicates
+    """
+
+    help = "Backfill image hashes and report duplicate and similar images"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=1, help="Number of worker processes"
+        )
+        parser.add_argument(
+            "--batch", type=int, default=100, help="Images per unit of work"
+        )
+        parser.add_argument(
+            "--all", action="store_true", help="Hash images that already have hashes"
+        )
+        parser.add_argument(
+            "--report", action="store_true", help="List duplicate and similar images"
+        )
+        parser.add_argument(
+            "--bits",
+            type=int,
+            default=SIMILAR_BITS,
+            help=f"Most bits in which similar images differ, at most {MAX_BITS}",
+        )
+
+    def handle(self, *args, **options):
+        if not 0 <= options["bits"] <= MAX_BITS:
+            raise CommandError(f"--bits must be between 0 and {MAX_BITS}")
+        images = CustomImage.objects.order_by("id")
+        if not options["all"]:
+            images = images.filter(phash="")
+        pairs = list(images.values_list("id", "file"))
+        size = options["batch"]
+        batches = [pairs[i : i + size] for i in range(0, len(pairs), size)]
+        self.stdout.write(f"{len(pairs)} images, {options['workers']} workers")
+
+        self.total = len(pairs)
+        self.count = 0
+        self.errors = []
+        self.start = time.monotonic()
+        if options["workers"] > 1:
+            # Workers only read files, so they need no database connection
+            with Pool(options["workers"]) as pool:
+                for result in pool.imap_unordered(hash_batch, batches):
+                    self.record(*result)
+        else:
+            for batch in batches:
+                self.record(*hash_batch(batch))
+        for id, error in self.errors:
+            self.stdout.write(f"Image {id}: {error}")
+        self.stdout.write(
+            f"Done: {self.count} images hashed, {len(self.errors)} errors"
+        )
+        if options["report"]:
+            self.report(options["bits"])
+
+    def record(self, hashes, errors):
+        images = [
+            CustomImage(id=id, file_hash=file_hash, phash=phash)
+            for id, file_hash, phash in hashes
+        ]
+        CustomImage.objects.bulk_update(images, ["file_hash", "phash"])
+        ImageBand.store(images)
+        self.errors.extend(errors)
+        self.count += len(hashes)
+        rate = self.count / max(time.monotonic() - self.start, 0.001)
+        self.stdout.write(f"{self.count} of {self.total} images, {rate:.1f} images/s")
+
+    def report(self, bits):
+        duplicates = (
+            CustomImage.objects.exclude(file_hash="")
+            .values("file_hash")
+            .annotate(count=Count("id"))
+            .filter(count__gt=1)
+            .values_list("file_hash", flat=True)
+        )
+        titles = {}
+        for image in CustomImage.objects.filter(file_hash__in=duplicates).order_by(
+            "id"
+        ):
+            titles.setdefault(image.file_hash, []).append(f"{image.id} {image.title}")
+        self.stdout.write(self.style.SUCCESS(f"{len(titles)} sets of duplicates"))
+        for group in titles.values():
+            self.stdout.write("  " + " = ".join(group))
+
+        hashes = CustomImage.objects.exclude(phash="").values_list("id", "phash")
+        pairs = similar_pairs(hashes, bits)
+        self.stdout.write(self.style.SUCCESS(f"{len(pairs)} similar pairs"))
+        for first, second in pairs:
+            self.stdout.write(f"  {first} ~ {second}")
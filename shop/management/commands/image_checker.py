@@ -1,19 +1,23 @@
-import os
-
-from django.conf import settings
 from django.core.management.base import BaseCommand
-from wagtail.models import Collection
 
-from shop.models import CustomImage, CustomRendition, Item, Photo
+from shop.models import CustomImage, Item
 
 
 class Command(BaseCommand):
     """
-    Scan every item, and identify any where the image is in error
+    Scan every image, check the original and a thumbnail exist on disk
+    and store the result that is used to classify images on item pages
     """
 
     help = "Check items for image errors"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--unchecked",
+            action="store_true",
+            help="Only check images that have never been checked",
+        )
+
     def handle(self, *args, **options):
         no_primary = (
             Item.objects.filter(image_id__isnull=True, state=1)
@@ -21,33 +25,19 @@ class Command(BaseCommand):
             .values_list("ref", flat=True)
         )
         for ref in no_primary:
-            print(ref, "no image")
+            self.stdout.write(f"{ref} no image")
 
-        image_ids = (
-            Item.objects.filter(image_id__isnull=False)
-            .order_by("ref")
-            .values_list("image_id", flat=True)
-        )
+        images = CustomImage.objects.select_related("item").order_by("id")
+        if options["unchecked"]:
+            images = images.filter(file_checked__isnull=True)
         count = 0
-        batch = 0
-        for id in image_ids:
-            image = CustomImage.objects.get(id=id)
-            thumb = image.get_rendition("max-100x100")
-            path = "media/" + thumb.file.name
+        bad = 0
+        for image in images.iterator(chunk_size=500):
             count += 1
-            if not os.path.exists(path):
-                print(image.item.ref, "Cannot create thumbnail")
-                # try:
-                #     l = len(image.file)
-                # except Exception as e:
-                #     print("Image", image.item.id, image.item.ref, str(e))
-                # try:
-                #     image.get_rendition("max-250x250")
-                # except Exception as e:
-                #     print("Rendition", image.item.id, image.item.ref, str(e))
-                # count += 1
-                # batch += 1
-                # if batch == 100:
-                #     print(f"{count} of {len(image_ids)}")
-                #     batch = 0
-        print(count, "items checked")
+            if not image.check_file():
+                bad += 1
+                ref = image.item.ref if image.item else "No item"
+                self.stdout.write(f"{ref} image {image.id} file is missing")
+            if count % 500 == 0:
+                self.stdout.write(f"{count} images checked")
+        self.stdout.write(f"{count} images checked, {bad} bad")
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.ingest import WORKERS, claim_job, run_job
+
+
+class Command(BaseCommand):
+    """
+    Run queued photo ingestion jobs
+    Run once from cron, or with --loop as a long running worker
+    """
+
+    help = "Turn uploaded photos into item images"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=WORKERS, help="Processes resizing photos"
+        )
+        parser.add_argument(
+            "--loop", action="store_true", help="Keep polling for new jobs"
+        )
+        parser.add_argument(
+            "--interval", type=int, default=2, help="Seconds between polls"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_job()
+            if job:
+                run_job(job, options["workers"])
+                self.stdout.write(f"Job {job.id}: {job.stage} {job.error}".strip())
+                # Drain the queue before waiting
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -1,33 +1,140 @@
+import hashlib
 import os
+import time
+from multiprocessing import Pool
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
-from wagtail.models import Collection
+from django.db import connections
 
-from shop.models import CustomImage, CustomRendition, Item, Photo
+from shop import renditions
+from shop.models import CustomImage, Item
+
+DEFAULT_SPECS = renditions.all_specs()
+
+
+def checkpoint_path(specs, all_images):
+    """A run only resumes from a checkpoint made with the same specs and images"""
+    key = ",".join(sorted(specs)) + (":all" if all_images else ":primary")
+    digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+    return os.path.join(settings.MEDIA_ROOT, f"make_renditions.{digest}.checkpoint")
+
+
+def render_batch(args):
+    """
+    Generate the missing renditions for a batch of image ids
+    Returns (ids, renditions created, list of (id, error))
+    """
+    ids, specs = args
+    created = 0
+    errors = []
+    images = CustomImage.objects.filter(id__in=ids).prefetch_renditions(*specs)
+    for image in images:
+        existing = {rendition.filter_spec for rendition in image.prefetched_renditions}
+        missing = [spec for spec in specs if spec not in existing]
+        if not missing:
+            continue
+        try:
+            image.get_renditions(*missing)
+            created += len(missing)
+        except Exception as e:
+            errors.append((image.id, str(e)))
+    return ids, created, errors
 
 
 class Command(BaseCommand):
     """
-    Initial creation of Wagtail images from source images that have been uploaded to original_images
-    This completely replaces all item images and nukes all custom images
+    Create renditions for item images, optionally in parallel worker processes
+    Existing renditions are skipped and progress is checkpointed so an
+    interrupted run resumes where it left off
     """
 
     help = "Create standard renditions for all items"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=1, help="Number of worker processes"
+        )
+        parser.add_argument(
+            "--specs",
+            nargs="+",
+            default=DEFAULT_SPECS,
+            help="Filter specs to render",
+        )
+        parser.add_argument(
+            "--batch", type=int, default=50, help="Images per unit of work"
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Render all images, not just the primary image of each item",
+        )
+        parser.add_argument(
+            "--restart", action="store_true", help="Ignore any saved checkpoint"
+        )
+
     def handle(self, *args, **options):
-        image_ids = Item.objects.all().values_list("image_id", flat=True)
-        count = 0
-        batch = 0
-        for id in image_ids:
-            if id:
-                image = CustomImage.objects.get(id=id)
-                image.get_rendition("max-100x100")
-                image.get_rendition("max-250x250")
-                image.get_rendition("max-1000x1000")
-                count += 1
-                batch += 1
-                if batch == 100:
-                    print(f"{count} of {len(image_ids)}")
-                    batch = 0
-        print("done")
+        specs = options["specs"]
+        if options["all"]:
+            ids = CustomImage.objects.order_by("id").values_list("id", flat=True)
+        else:
+            ids = (
+                Item.objects.filter(image__isnull=False)
+                .order_by("image_id")
+                .values_list("image_id", flat=True)
+                .distinct()
+            )
+        self.checkpoint_path = checkpoint_path(specs, options["all"])
+        done = set() if options["restart"] else self.read_checkpoint()
+        ids = [id for id in ids if id not in done]
+        if done:
+            self.stdout.write(f"Resuming: {len(done)} images already done")
+        size = options["batch"]
+        batches = [(ids[i : i + size], specs) for i in range(0, len(ids), size)]
+        self.stdout.write(
+            f"{len(ids)} images, {len(specs)} specs, {options['workers']} workers"
+        )
+
+        self.total = len(ids)
+        self.count = 0
+        self.created = 0
+        self.errors = []
+        self.start = time.monotonic()
+        with open(self.checkpoint_path, "a") as self.checkpoint:
+            if options["workers"] > 1:
+                # Workers open their own connections; close ours before forking
+                # so that none is inherited and shared with them
+                connections.close_all()
+                with Pool(options["workers"]) as pool:
+                    for result in pool.imap_unordered(render_batch, batches):
+                        self.record(*result)
+            else:
+                for batch in batches:
+                    self.record(*render_batch(batch))
+        elapsed = time.monotonic() - self.start
+        for id, error in self.errors:
+            self.stdout.write(f"Image {id}: {error}")
+        self.stdout.write(
+            f"Done: {self.count} images in {elapsed:.1f}s "
+            f"({self.count / max(elapsed, 0.001):.1f} images/s), "
+            f"{self.created} renditions created, {len(self.errors)} errors"
+        )
+        if not self.errors:
+            os.remove(self.checkpoint_path)
+
+    def record(self, ids, created, errors):
+        """Save a finished batch to the checkpoint and report throughput"""
+        failed = {id for id, _ in errors}
+        self.checkpoint.write("".join(f"{id}\n" for id in ids if id not in failed))
+        self.checkpoint.flush()
+        self.errors.extend(errors)
+        self.count += len(ids)
+        self.created += created
+        rate = self.count / max(time.monotonic() - self.start, 0.001)
+        self.stdout.write(f"{self.count} of {self.total} images, {rate:.1f} images/s")
+
+    def read_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return set()
+        with open(self.checkpoint_path) as checkpoint:
+            return {int(line) for line in checkpoint if line.strip()}
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from shop.models import Category
+
+
+class Command(BaseCommand):
+    """
+    Recalculate the shop and archive item counts stored on every category
+    Counts are normally maintained incrementally when items change
+    """
+
+    help = "Rebuild category item counts"
+
+    def handle(self, *args, **options):
+        count = Category.objects.rebuild_counts()
+        self.stdout.write(f"Counts rebuilt for {count} categories")
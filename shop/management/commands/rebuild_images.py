@@ -4,6 +4,7 @@ from django.conf import settings
 from django.core.management.base import BaseCommand
 from wagtail.models import Collection
 
+from shop.image_hash import file_hash
 from shop.models import CustomImage, CustomRendition, Item, Photo
 
 
@@ -33,6 +34,7 @@ class Command(BaseCommand):
         count = 0
         not_found = 0
         created = 0
+        duplicates = 0
         for item in Item.objects.all():
             count += 1
             name = item.ref
@@ -60,11 +62,21 @@ class Command(BaseCommand):
                                 min = len(photo.title)
                                 primary = photo
                 # Create all images linked to item and link primary image
-                for photo in photos:
+                # Files with the same content as one already created are skipped
+                hashes = set()
+                for photo in sorted(photos, key=lambda photo: photo != primary):
                     if not photo.title[len(name)].isdigit():
                         path = os.path.join("original_images", photo.title)
+                        content_hash = file_hash(
+                            os.path.join(settings.MEDIA_ROOT, path)
+                        )
+                        if content_hash in hashes:
+                            duplicates += 1
+                            continue
+                        hashes.add(content_hash)
                         new_image = CustomImage.objects.create(
                             file=path,
+                            file_hash=content_hash,
                             title=item.ref + " " + item.name,
                             collection_id=collection.id,
                             uploaded_by_user=None,
@@ -74,4 +86,7 @@ class Command(BaseCommand):
                         if photo == primary:
                             item.image = new_image
                             item.save()
-        print(f"Created {created} images from {count} items, {not_found} not found")
+        print(
+            f"Created {created} images from {count} items, {not_found} not found, "
+            f"{duplicates} duplicates skipped"
+        )
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from shop.models import Item
+
+
+class Command(BaseCommand):
+    """
+    Store the HTML and plain text renderings of every item description
+    Items render their description on save, so this is only needed after
+    adding the columns or changing the MARKDOWNIFY settings
+    """
+
+    help = "Render item descriptions into description_html and description_text"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch", type=int, default=500, help="Items per bulk update"
+        )
+
+    def handle(self, *args, **options):
+        size = options["batch"]
+        items = Item.objects.order_by("id").only("id", "description")
+        batch = []
+        count = 0
+        for item in items.iterator(chunk_size=size):
+            item.render_description()
+            batch.append(item)
+            if len(batch) == size:
+                count += self.save(batch)
+        count += self.save(batch)
+        self.stdout.write(f"Descriptions rendered for {count} items")
+
+    @staticmethod
+    def save(batch):
+        Item.objects.bulk_update(batch, ["description_html", "description_text"])
+        count = len(batch)
+        batch.clear()
+        return count
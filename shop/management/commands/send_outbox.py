@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.outbox import send_batch
+
+
+class Command(BaseCommand):
+    """
+    Deliver queued email
+    Run once from cron, or with --loop as a long running worker
+    """
+
+    help = "Send queued outbound email"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch", type=int, default=50, help="Messages per SMTP connection"
+        )
+        parser.add_argument(
+            "--loop", action="store_true", help="Keep polling for new messages"
+        )
+        parser.add_argument(
+            "--interval", type=int, default=10, help="Seconds between polls"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_batch(options["batch"])
+            if sent or failed:
+                self.stdout.write(f"Sent {sent}, failed {failed}")
+            # Drain the queue before waiting
+            if sent == options["batch"]:
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,58 @@
+# Generated by Django 4.2 on 2026-10-18 15:01
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count
+
+STEPLEN = 4
+
+
+def set_item_counts(apps, schema_editor):
+    """Initial values for the counts, see CategoryManager.rebuild_counts()"""
+    Category = apps.get_model("shop", "Category")
+    Item = apps.get_model("shop", "Item")
+    totals = defaultdict(lambda: [0, 0])
+    rows = (
+        Item.objects.filter(
+            category__isnull=False,
+            library__in=(0, 1),
+            visible=True,
+            image__isnull=False,
+        )
+        .exclude(slug="")
+        .order_by()
+        .values_list("category__path", "library")
+        .annotate(total=Count("id"))
+    )
+    for path, library, total in rows:
+        for end in range(STEPLEN, len(path) + 1, STEPLEN):
+            totals[path[:end]][library] += total
+    categories = list(Category.objects.all())
+    for category in categories:
+        category.shop_count, category.archive_count = totals.get(category.path, (0, 0))
+    Category.objects.bulk_update(categories, ["shop_count", "archive_count"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shop", "0050_customimage_description"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="category",
+            name="count",
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="archive_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="shop_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(set_item_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2 on 2026-10-18 15:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shop", "0051_category_item_counts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customimage",
+            name="file_checked",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="customimage",
+            name="file_ok",
+            field=models.BooleanField(default=True),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.2 on 2026-10-18 15:09
+
+import re
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+# The text search config shop.search queries with
+CONFIG = settings.WAGTAILSEARCH_BACKENDS["default"].get("SEARCH_CONFIG", "english")
+if not re.fullmatch(r"[a-z_]+", CONFIG):
+    raise ValueError(f"Unexpected SEARCH_CONFIG {CONFIG!r}")
+
+# Weights: name A, ref B, description C, provenance D
+# ref uses the simple config so references are not stemmed
+CREATE_SQL = [
+    f"""
+    CREATE FUNCTION shop_item_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('{CONFIG}', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(NEW.ref, '')), 'B') ||
+            setweight(to_tsvector('{CONFIG}', coalesce(NEW.description, '')), 'C') ||
+            setweight(to_tsvector('{CONFIG}', coalesce(NEW.provenance, '')), 'D');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER shop_item_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, ref, description, provenance ON shop_item
+    FOR EACH ROW EXECUTE FUNCTION shop_item_search_vector()
+    """,
+    "UPDATE shop_item SET name = name",
+    "CREATE INDEX shop_item_search_vector_gin ON shop_item USING gin (search_vector)",
+]
+
+DROP_SQL = [
+    "DROP INDEX IF EXISTS shop_item_search_vector_gin",
+    "DROP TRIGGER IF EXISTS shop_item_search_vector_trigger ON shop_item",
+    "DROP FUNCTION IF EXISTS shop_item_search_vector()",
+]
+
+
+def run_on_postgres(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == "postgresql":
+            for sql in statements:
+                schema_editor.execute(sql)
+
+    return run
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shop", "0052_customimage_file_ok"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="item",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(run_on_postgres(CREATE_SQL), run_on_postgres(DROP_SQL)),
+    ]
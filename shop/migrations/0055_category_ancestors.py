@@ -0,0 +1,54 @@
+# Generated by Django 4.2 on 2026-10-18 15:12
+
+from django.db import migrations, models
+
+STEPLEN = 4
+
+
+def extend_seo_prefix(prefix, short_name):
+    """Copy of Category.extend_seo_prefix()"""
+    for dup in prefix.split(" "):
+        if dup in short_name:
+            short_name = short_name.replace(dup, "")
+    if short_name == "Catalogue":
+        return "Antique"
+    return " ".join(f"{prefix} {short_name}".split())
+
+
+def set_ancestors(apps, schema_editor):
+    """Initial values, see Category.update_slugs()"""
+    Category = apps.get_model("shop", "Category")
+    nodes = {}
+    for node in Category.objects.order_by("path"):
+        short_name = node.short_name or node.name[:50]
+        parent = nodes.get(node.path[:-STEPLEN])
+        if parent is None:
+            node.ancestors = []
+            node.seo_prefix = extend_seo_prefix("", short_name)
+        else:
+            node.ancestors = parent.ancestors + [[parent.id, parent.name, parent.slug]]
+            node.seo_prefix = extend_seo_prefix(parent.seo_prefix, short_name)
+        nodes[node.path] = node
+    Category.objects.bulk_update(
+        nodes.values(), ["ancestors", "seo_prefix"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shop", "0054_outboundemail"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="ancestors",
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="seo_prefix",
+            field=models.CharField(blank=True, default="", max_length=400),
+        ),
+        migrations.RunPython(set_ancestors, migrations.RunPython.noop),
+    ]
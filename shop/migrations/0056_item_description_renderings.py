@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-18 15:16
+
+from django.db import migrations, models
+
+from shop.text import markdown_html, markdown_text
+
+
+def render_descriptions(apps, schema_editor):
+    """Initial values, see the render_descriptions command"""
+    Item = apps.get_model("shop", "Item")
+    items = []
+    for item in Item.objects.exclude(description=None).only("id", "description"):
+        item.description_html = markdown_html(item.description)
+        item.description_text = markdown_text(item.description)
+        items.append(item)
+    Item.objects.bulk_update(
+        items, ["description_html", "description_text"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shop", "0055_category_ancestors"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="item",
+            name="description_html",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.AddField(
+            model_name="item",
+            name="description_text",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.RunPython(render_descriptions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+# Supports the keyset ordering of Category.shop_items() and archive_items(),
+# see shop.pagination. Postgres only because SQLite indexes cannot say NULLS LAST
+CREATE_SQL = """
+    CREATE INDEX shop_item_grid_keyset ON shop_item
+    (category_id, library, featured DESC, rank, sale_price DESC NULLS LAST, name, id)
+    WHERE visible AND image_id IS NOT NULL
+"""
+
+DROP_SQL = "DROP INDEX IF EXISTS shop_item_grid_keyset"
+
+
+def run_on_postgres(sql):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == "postgresql":
+            schema_editor.execute(sql)
+
+    return run
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shop", "0056_item_description_renderings"),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_postgres(CREATE_SQL), run_on_postgres(DROP_SQL)),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-18 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shop", "0057_item_grid_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(fields=["library", "ref"], name="item_library_ref"),
+        ),
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(fields=["state", "ref"], name="item_state_ref"),
+        ),
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(fields=["archive", "ref"], name="item_archive_ref"),
+        ),
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(fields=["category", "ref"], name="item_category_ref"),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2 on 2026-10-18 15:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shop", "0059_cart"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InvoiceNumber",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("number", models.IntegerField()),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shop", "0061_photo_user"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customimage",
+            name="phash",
+            field=models.CharField(blank=True, max_length=16),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2 on 2026-10-18 16:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# As shop.image_hash.band_keys, copied so the migration does not change with it
+BANDS = 8
+WIDTH = 8
+
+
+def store_bands(apps, schema_editor):
+    CustomImage = apps.get_model("shop", "CustomImage")
+    ImageBand = apps.get_model("shop", "ImageBand")
+    mask = (1 << WIDTH) - 1
+    bands = []
+    for id, phash in CustomImage.objects.exclude(phash="").values_list("id", "phash"):
+        value = int(phash, 16)
+        for band in range(BANDS):
+            key = band << WIDTH | value >> (band * WIDTH) & mask
+            bands.append(ImageBand(image_id=id, key=key))
+    ImageBand.objects.bulk_create(bands, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shop", "0063_ingestjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImageBand",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.PositiveSmallIntegerField(db_index=True)),
+                (
+                    "image",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="bands",
+                        to="shop.customimage",
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(store_bands, migrations.RunPython.noop),
+    ]
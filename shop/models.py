@@ -1,12 +1,25 @@
 import os
-from django.db import models
+from asgiref.local import Local
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models import Count, F, Max, Prefetch, Q
+from django.db.models.functions import Cast
 from django.urls import reverse
 from django.utils.text import slugify
+from django.utils.timezone import now
 from enum import IntEnum
-from treebeard.mp_tree import MP_Node, MP_NodeManager
+from treebeard.mp_tree import MP_Node, MP_NodeManager, MP_NodeQuerySet
 from wagtail.images.models import Image, AbstractImage, AbstractRendition
 from wagtail.search import index
 from coderedcms.models.page_models import CoderedPage
+from shop.cache import CATEGORY_TREE, GLOBAL_SETTINGS, ITEMS, bump_version, get_version
+from shop.image_hash import band_keys, image_hashes
+from shop.pagination import Keyset
+from shop import renditions
+from shop.text import markdown_html, markdown_text
 
 
 class ModelEnum(IntEnum):
@@ -29,7 +42,28 @@ class HostPage(CoderedPage):
     #     return site_id, root_url, page_path
 
 
+class RenditionsMixin:
+    """Queryset helper for grids that show a rendition of a linked image"""
+
+    def with_renditions(self, *filter_specs, field="image"):
+        """Fetch the image with the query and its renditions in one more query"""
+        return self.select_related(field).prefetch_related(
+            Prefetch(
+                f"{field}__renditions",
+                queryset=CustomRendition.objects.filter(filter_spec__in=filter_specs),
+                to_attr="prefetched_renditions",
+            )
+        )
+
+
+class CategoryQuerySet(RenditionsMixin, MP_NodeQuerySet):
+    pass
+
+
 class CategoryManager(MP_NodeManager):
+    def get_queryset(self):
+        return CategoryQuerySet(self.model).order_by("path")
+
     def empty_nodes(self, instance=None):
         """returns node above current node that have no item"""
         cats = Category.objects.all().exclude(name="Catalogue").order_by("name")
@@ -48,6 +82,37 @@ class CategoryManager(MP_NodeManager):
             (cat.id, cat.name) for cat in self.all().order_by("name") if cat.is_leaf()
         ]
 
+    def adjust_counts(self, changes):
+        """
+        Apply item count changes to categories and all their ancestors
+        changes maps a category path to [shop delta, archive delta]
+        """
+        by_delta = defaultdict(list)
+        for path, delta in Category.propagate_counts(changes).items():
+            if any(delta):
+                by_delta[tuple(delta)].append(path)
+        for (shop, archive), paths in by_delta.items():
+            self.filter(path__in=paths).update(
+                shop_count=F("shop_count") + shop,
+                archive_count=F("archive_count") + archive,
+            )
+
+    def rebuild_counts(self):
+        """
+        Recalculate all item counts from a single aggregate query
+        Used by the rebuild_counts repair command
+        """
+        totals = Category.propagate_counts(
+            Item.objects.filter(category__isnull=False).category_counts()
+        )
+        categories = list(self.only("id", "path", "shop_count", "archive_count"))
+        for category in categories:
+            category.shop_count, category.archive_count = totals.get(
+                category.path, (0, 0)
+            )
+        self.bulk_update(categories, ["shop_count", "archive_count"], batch_size=500)
+        return len(categories)
+
 
 class Category(MP_Node):
     """
@@ -78,8 +143,14 @@ class Category(MP_Node):
         related_name="archive_category",
     )
     sequence = models.PositiveIntegerField(default=0)
-    count = models.IntegerField(default=0)
+    # Number of visible items with an image in this category and its descendants
+    shop_count = models.IntegerField(default=0)
+    archive_count = models.IntegerField(default=0)
     hidden = models.BooleanField(default=False)
+    # Denormalised from the ancestors by update_slugs()
+    # ancestors is a list of [id, name, slug] from the root down to the parent
+    ancestors = models.JSONField(default=list, blank=True)
+    seo_prefix = models.CharField(max_length=400, blank=True, default="")
     node_order_by = ["sequence"]
     objects = CategoryManager()
 
@@ -90,42 +161,80 @@ class Category(MP_Node):
 
     def post_save(self):
         """Called after create or update to ensure tree slugs are updated"""
+        self.update_slugs()
+        bump_version(CATEGORY_TREE)
+
+    def update_slugs(self, parent=None):
+        """Set slug, ancestors and seo_prefix from the parent and update descendants"""
         self = Category.objects.get(id=self.id)
         if not self.short_name:
             self.short_name = self.name[:50]
-        if self.is_root():
+        if parent is None and not self.is_root():
+            parent = self.get_parent()
+        if parent is None:
             self.slug = slugify(self.short_name)
+            self.ancestors = []
+            self.seo_prefix = self.extend_seo_prefix("", self.short_name)
         else:
-            self.slug = self.get_parent().slug + "/" + slugify(self.short_name)
+            self.slug = parent.slug + "/" + slugify(self.short_name)
+            self.ancestors = parent.ancestors + [[parent.id, parent.name, parent.slug]]
+            self.seo_prefix = self.extend_seo_prefix(parent.seo_prefix, self.short_name)
         self.save()
         for child in self.get_children():
-            child.post_save()
+            child.update_slugs(parent=self)
+
+    @staticmethod
+    def extend_seo_prefix(prefix, short_name):
+        """Add a node to its parent's prefix, dropping words already present"""
+        for dup in prefix.split(" "):
+            if dup in short_name:
+                short_name = short_name.replace(dup, "")
+        if short_name == "Catalogue":
+            return "Antique"
+        return " ".join(f"{prefix} {short_name}".split())
+
+    def delete(self, *args, **kwargs):
+        # Items in the subtree lose their category without sending item signals
+        changes = self.subtree_changes(-1)
+        result = super().delete(*args, **kwargs)
+        Category.objects.adjust_counts(changes)
+        bump_version(CATEGORY_TREE)
+        return result
+
+    def subtree_changes(self, sign):
+        """
+        Count changes that remove (-1) or add (+1) this subtree's items to its
+        ancestors. Paths change on a move, so apply them before or after it
+        """
+        parent_path = self.path[: -self.steplen]
+        return {parent_path: [sign * self.shop_count, sign * self.archive_count]}
+
+    @classmethod
+    def ancestor_paths(cls, path):
+        """Paths of all ancestors of a node including the node itself"""
+        return [path[:end] for end in range(cls.steplen, len(path) + 1, cls.steplen)]
+
+    @classmethod
+    def propagate_counts(cls, counts):
+        """Add counts keyed on category path to the path's ancestors"""
+        totals = defaultdict(lambda: [0, 0])
+        for path, (shop, archive) in counts.items():
+            for ancestor in cls.ancestor_paths(path):
+                totals[ancestor][0] += shop
+                totals[ancestor][1] += archive
+        return totals
 
     def breadcrumb_nodes(self, item_view=False):
-        breadcrumb = []
+        """Nodes from the root down to this one, built without queries"""
+        breadcrumb = [
+            Category(id=id, name=name, slug=slug) for id, name, slug in self.ancestors
+        ]
+        for node in breadcrumb:
+            node.active = False
         self.active = not item_view
         breadcrumb.append(self)
-        parent = self.get_parent()
-        while parent:
-            parent.active = False
-            breadcrumb.insert(0, parent)
-            parent = parent.get_parent()
         return breadcrumb
 
-    def seo_prefix(self):
-        """Returns the prefix used for item title"""
-        breadcrumb = self.breadcrumb_nodes()
-        result = ""
-        for node in breadcrumb:
-            for dup in result.split(" "):
-                if dup in node.short_name:
-                    node.short_name = node.short_name.replace(dup, "")
-            if node.short_name == "Catalogue":
-                result = "Antique "
-            else:
-                result += node.short_name + " "
-        return " ".join(result.split())
-
     def get_absolute_url(self):
         return "/" + self.slug + "/"
 
@@ -144,12 +253,9 @@ class Category(MP_Node):
                 image__isnull=False,
             )
             .exclude(slug="")
-            .order_by("-featured", "rank", "-sale_price", "name")
+            .order_by(*GRID_KEYSET.ordering())
         )
 
-    def shop_count(self):
-        return self.shop_items().count()
-
     def archive_items(self):
         return (
             self.item_set.filter(
@@ -158,11 +264,84 @@ class Category(MP_Node):
                 image__isnull=False,
             )
             .exclude(slug="")
-            .order_by("-featured", "rank", "-sale_price", "name")
+            .order_by(*GRID_KEYSET.ordering())
         )
 
-    def archive_count(self):
-        return self.archive_items().count()
+
+class ItemQuerySet(RenditionsMixin, models.QuerySet):
+    # Fields that decide whether an item is included in category counts
+    counted_fields = {
+        "category",
+        "category_id",
+        "library",
+        "visible",
+        "image",
+        "image_id",
+        "slug",
+    }
+
+    def counted(self):
+        """Items shown in the public shop and archive grids"""
+        return self.filter(
+            library__in=(Item.Library.STOCK, Item.Library.ARCHIVE),
+            visible=True,
+            image__isnull=False,
+        ).exclude(slug="")
+
+    def category_counts(self):
+        """Return a dict of category path to [shop count, archive count]"""
+        counts = defaultdict(lambda: [0, 0])
+        rows = (
+            self.counted()
+            .order_by()
+            .values_list("category__path", "library")
+            .annotate(total=Count("id"))
+        )
+        for path, library, total in rows:
+            if path:
+                counts[path][0 if library == Item.Library.STOCK else 1] += total
+        return counts
+
+    def counts_by_category(self):
+        """Return a dict of category id to (shop count, archive count)"""
+        rows = (
+            self.counted()
+            .filter(category__isnull=False)
+            .order_by()
+            .values("category_id")
+            .annotate(
+                shop=Count("id", filter=Q(library=Item.Library.STOCK)),
+                archive=Count("id", filter=Q(library=Item.Library.ARCHIVE)),
+            )
+        )
+        return {row["category_id"]: (row["shop"], row["archive"]) for row in rows}
+
+    def update(self, **kwargs):
+        if "description" in kwargs:
+            kwargs["description_html"] = markdown_html(kwargs["description"])
+            kwargs["description_text"] = markdown_text(kwargs["description"])
+        # Any change can move items within the grids, and cached item pages
+        # are keyed on updated, which auto_now does not set for bulk updates
+        kwargs.setdefault("updated", now())
+        bump_version(ITEMS)
+        if not self.counted_fields.intersection(kwargs):
+            return super().update(**kwargs)
+        pks = list(self.values_list("pk", flat=True))
+        before = Item.objects.filter(pk__in=pks).category_counts()
+        rows = super().update(**kwargs)
+        after = Item.objects.filter(pk__in=pks).category_counts()
+        Category.objects.adjust_counts(count_changes(before, after))
+        return rows
+
+
+def count_changes(before, after):
+    """Difference between two results of ItemQuerySet.category_counts()"""
+    changes = {}
+    for path in set(before) | set(after):
+        old = before.get(path, (0, 0))
+        new = after.get(path, (0, 0))
+        changes[path] = [new[0] - old[0], new[1] - old[1]]
+    return changes
 
 
 class Item(index.Indexed, models.Model):
@@ -192,6 +371,9 @@ class Item(index.Indexed, models.Model):
         null=False, blank=True, max_length=10, default="", db_index=True
     )
     description = models.TextField(null=True, blank=True)
+    # Renderings of the Markdown description, set by save()
+    description_html = models.TextField(blank=True, default="", editable=False)
+    description_text = models.TextField(blank=True, default="", editable=False)
     seo_description = models.CharField(max_length=200, null=True, blank=True)
     category = models.ForeignKey(
         Category, null=True, blank=True, on_delete=models.SET_NULL
@@ -237,6 +419,8 @@ class Item(index.Indexed, models.Model):
     search_fields = [
         index.SearchField("name", boost=3),
         index.SearchField("ref"),
+        index.SearchField("description"),
+        index.SearchField("provenance"),
         index.FilterField("image_id"),
         index.FilterField("category_id"),
         index.FilterField("archive"),
@@ -244,6 +428,19 @@ class Item(index.Indexed, models.Model):
     ]
     book = models.ForeignKey("Book", null=True, blank=True, on_delete=models.SET_NULL)
     updated = models.DateTimeField(auto_now=True)
+    # Maintained by a database trigger on Postgres, see migration 0053
+    search_vector = SearchVectorField(null=True, editable=False)
+    objects = ItemQuerySet.as_manager()
+
+    class Meta:
+        # The staff item table filters on these and orders by ref
+        # The public grid index is Postgres specific, see migration 0057
+        indexes = [
+            models.Index(fields=["library", "ref"], name="item_library_ref"),
+            models.Index(fields=["state", "ref"], name="item_state_ref"),
+            models.Index(fields=["archive", "ref"], name="item_archive_ref"),
+            models.Index(fields=["category", "ref"], name="item_category_ref"),
+        ]
 
     def __str__(self):
         return f"{self.ref} {self.name}"
@@ -256,34 +453,41 @@ class Item(index.Indexed, models.Model):
 
     def save(self, *args, **kwargs):
         self.slug = slugify(self.name)
+        self.render_description()
         super().save(*args, **kwargs)
 
-    def visible_images(self):
-        """return images with primary in first position"""
-        image_list = self.images.filter(show=True).order_by("position", "title")
-        if self.image:
-            image_list = list(image_list.exclude(id=self.image_id))
-            image_list.insert(0, self.image)
-        else:
-            image_list = list(image_list)
+    def render_description(self):
+        self.description_html = markdown_html(self.description)
+        self.description_text = markdown_text(self.description)
+
+    def visible_images(self, check_files=False):
+        """
+        return images with primary in first position
+        Images are classified as good or bad using the stored file check
+        unless check_files is True, when the files are checked on disk
+        """
+        image_list = list(
+            CustomImage.objects.filter(Q(item=self, show=True) | Q(id=self.image_id))
+            .order_by("position", "title")
+            .prefetch_renditions(*renditions.all_specs())
+        )
+        image_list.sort(key=lambda image: image.id != self.image_id)
         good_images = []
         bad_images = []
         for image in image_list:
-            path = "media/" + image.file.name
-            if os.path.exists(path):
-                # Try to generate a thumbnail to ensure files are present
-                thumb = image.get_rendition("max-100x100")
-                path = "media/" + thumb.file.name
-                if os.path.exists(path):
-                    good_images.append(image)
-                else:
-                    bad_images.append(image)
+            file_ok = image.check_file() if check_files else image.file_ok
+            if file_ok:
+                good_images.append(image)
             else:
                 bad_images.append(image)
         return good_images, bad_images
 
     def hidden_images(self):
-        return self.images.filter(show=False).order_by("title")
+        return (
+            self.images.filter(show=False)
+            .order_by("title")
+            .prefetch_renditions(*renditions.all_specs())
+        )
 
     def last_position(self):
         last = self.images.filter(show=True).order_by("position", "title").last()
@@ -306,6 +510,10 @@ class Item(index.Indexed, models.Model):
         return ""
 
 
+# Order of the public item grids, which are paged through this keyset
+GRID_KEYSET = Keyset(Item, "-featured", "rank", "-sale_price", "name", "id")
+
+
 class Purchase(models.Model):
     """Purchase can be a lot with multiple items linked"""
 
@@ -374,27 +582,67 @@ class PurchaseExpense(models.Model):
         return f"{self.id} {self.amount}"
 
 
-class ItemRef(models.Model):
-    """Generates unique alphanumeric reference numbers for items"""
+class Counter(models.Model):
+    """
+    Single row counter that hands out numbers atomically
+    The row is updated before it is read, so its row lock (the write lock on
+    SQLite) keeps concurrent allocations apart until the transaction commits
+    number is the next number to be handed out
+    """
 
     number = models.IntegerField(null=False, blank=False)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def initial(cls):
+        return {"number": 1}
+
+    @classmethod
+    def allocate(cls, count=1):
+        """Reserve count consecutive numbers and return the updated record"""
+        with transaction.atomic():
+            if not cls.objects.update(number=F("number") + count):
+                initial = cls.initial()
+                initial["number"] += count
+                record, created = cls.objects.get_or_create(pk=1, defaults=initial)
+                if created:
+                    return record
+                cls.objects.update(number=F("number") + count)
+            return cls.objects.get()
+
+    @classmethod
+    def peek(cls):
+        """The next number without reserving it"""
+        record = cls.objects.first()
+        return record if record else cls(**cls.initial())
+
+
+class ItemRef(Counter):
+    """Generates unique alphanumeric reference numbers for items"""
+
     prefix = models.CharField(max_length=2, null=False, blank=False)
 
     def __str__(self):
         return f"{self.prefix}{self.number}"
 
+    @classmethod
+    def initial(cls):
+        return {"prefix": "Z", "number": 1}
+
     @classmethod
     def get_next(cls, increment=True):
-        records = ItemRef.objects.all()
-        if len(records) == 0:
-            record = ItemRef.reset()
-        else:
-            record = records[0]
-        result = record.__str__()
         if increment:
-            record.number += 1
-            record.save()
-        return result
+            return cls.reserve(1)[0]
+        return str(cls.peek())
+
+    @classmethod
+    def reserve(cls, count):
+        """Allocate count refs in one step, for purchases and bulk imports"""
+        record = cls.allocate(count)
+        first = record.number - count
+        return [f"{record.prefix}{number}" for number in range(first, record.number)]
 
     @classmethod
     def reset(cls, prefix="Z", number=1):
@@ -407,28 +655,23 @@ class ItemRef(models.Model):
         return f"{ref[0]}{number}"
 
 
-# class InvoiceNumber(models.Model):
-#     """ Generate sequential numbers for invoices """
-#
-#     invoice_number = models.IntegerField(null=False, blank=False)
-#
-#     @classmethod
-#     def get_next(cls, increment=True):
-#         records = InvoiceNumber.objects.all()
-#         if len(records) == 0:
-#             record = InvoiceNumber.reset()
-#         else:
-#             record = records[0]
-#         result = record.invoice_number
-#         if increment:
-#             record.invoice_number = result + 1
-#             record.save()
-#         return result
-#
-#     @classmethod
-#     def reset(cls, number=1):
-#         InvoiceNumber.objects.all().delete()
-#         return InvoiceNumber.objects.create(invoice_number=number)
+class InvoiceNumber(Counter):
+    """Generate sequential numbers for invoices"""
+
+    @classmethod
+    def initial(cls):
+        # Continue from the highest numeric invoice number
+        highest = (
+            Invoice.objects.filter(number__regex=r"^[0-9]+$")
+            .annotate(value=Cast("number", models.IntegerField()))
+            .aggregate(Max("value"))["value__max"]
+        )
+        return {"number": (highest or 0) + 1}
+
+    @classmethod
+    def get_next(cls):
+        record = cls.allocate(1)
+        return record.number - 1
 
 
 class Invoice(models.Model):
@@ -446,10 +689,8 @@ class Invoice(models.Model):
 
     @classmethod
     def next_number(cls):
-        invs = cls.objects.all().order_by("-number")
-        if invs:
-            return int(invs.first().number) + 1
-        return 1
+        """The number the next invoice will get, without reserving it"""
+        return InvoiceNumber.peek().number
 
 
 class InvoiceCharge(models.Model):
@@ -471,6 +712,31 @@ class InvoiceCharge(models.Model):
         return f"{self.description} £{self.amount}"
 
 
+class Cart(models.Model):
+    """
+    A staff user's cart of items, charges and a buyer that becomes an invoice
+    Items in the cart are reserved and carry an agreed price on their line
+    """
+
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    buyer = models.ForeignKey(
+        "Contact", null=True, blank=True, on_delete=models.SET_NULL
+    )
+    charges = models.ManyToManyField("InvoiceCharge", blank=True)
+
+    def __str__(self):
+        return f"Cart for {self.user}"
+
+
+class CartLine(models.Model):
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name="lines")
+    item = models.ForeignKey("Item", on_delete=models.CASCADE)
+    agreed_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = (("cart", "item"),)
+
+
 class Contact(models.Model):
     """Covers all business contacts  - buyers, vendors etc"""
 
@@ -564,6 +830,10 @@ class Book(models.Model):
     def __str__(self):
         return self.title
 
+    def touch_items(self):
+        """Change updated on items that recommend this book, invalidating their cached pages"""
+        Item.objects.filter(book=self).update(updated=now())
+
 
 class CustomImage(AbstractImage):
     item = models.ForeignKey(
@@ -571,8 +841,88 @@ class CustomImage(AbstractImage):
     )
     show = models.BooleanField(default=True)
     position = models.PositiveSmallIntegerField(default=0)
+    # Result of the last check that the original and a thumbnail exist on disk
+    file_ok = models.BooleanField(default=True)
+    file_checked = models.DateTimeField(null=True, blank=True)
+    # Perceptual hash for finding near duplicates, see shop.image_hash
+    phash = models.CharField(max_length=16, blank=True)
     admin_form_fields = Image.admin_form_fields + ("item",)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_file = dict(zip(field_names, values)).get("file")
+        return instance
+
+    def save(self, *args, **kwargs):
+        hash_file = False
+        if self.file.name != getattr(self, "_loaded_file", None):
+            # A newly uploaded file is known to exist
+            self.file_ok = True
+            self.file_checked = now()
+            hash_file = not (self.file_hash and self.phash)
+        super().save(*args, **kwargs)
+        # An upload is only written to storage by the save
+        self._loaded_file = self.file.name
+        if hash_file:
+            self.set_hashes()
+
+    def set_hashes(self):
+        """Hash the stored original; a missing file leaves the hashes empty"""
+        try:
+            self.file_hash, self.phash = image_hashes(self.file.path)
+        except (OSError, ValueError):
+            return
+        CustomImage.objects.filter(id=self.id).update(
+            file_hash=self.file_hash, phash=self.phash
+        )
+        ImageBand.store([self])
+
+    def check_file(self):
+        """Check on disk that the original and a thumbnail exist and store the result"""
+        file_ok = os.path.exists(os.path.join(settings.MEDIA_ROOT, self.file.name))
+        if file_ok:
+            # Try to generate a thumbnail to ensure files are present
+            thumb = self.get_rendition("max-100x100")
+            file_ok = os.path.exists(os.path.join(settings.MEDIA_ROOT, thumb.file.name))
+        if file_ok != self.file_ok:
+            self.touch_items()
+        self.file_ok = file_ok
+        self.file_checked = now()
+        CustomImage.objects.filter(id=self.id).update(
+            file_ok=self.file_ok, file_checked=self.file_checked
+        )
+        return file_ok
+
+    def touch_items(self):
+        """Change updated on items that show this image, invalidating their cached pages"""
+        Item.objects.filter(Q(pk=self.item_id) | Q(image_id=self.id)).update(
+            updated=now()
+        )
+
+
+class ImageBand(models.Model):
+    """
+    The band keys of an image's phash, see shop.image_hash
+    Similar images share a key, so candidates are found with an indexed lookup
+    """
+
+    image = models.ForeignKey(
+        CustomImage, on_delete=models.CASCADE, related_name="bands"
+    )
+    key = models.PositiveSmallIntegerField(db_index=True)
+
+    @classmethod
+    def store(cls, images):
+        """Replace the band keys of images from their phash"""
+        cls.objects.filter(image__in=[image.id for image in images]).delete()
+        cls.objects.bulk_create(
+            cls(image_id=image.id, key=key)
+            for image in images
+            if image.phash
+            for key in band_keys(image.phash)
+        )
+
 
 class CustomRendition(AbstractRendition):
     image = models.ForeignKey(
@@ -587,6 +937,52 @@ class Photo(models.Model):
     title = models.CharField(max_length=255, blank=True)
     file = models.FileField(upload_to="photos/")
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.CASCADE
+    )
+
+
+class IngestJob(models.Model):
+    """
+    A request to turn a user's uploaded photos into images of an item
+    Queued by the images page and run by the ingest_photos command, which
+    records its progress here for the page to poll
+    """
+
+    MAX_ATTEMPTS = 3
+    # A started job not updated for this long was abandoned by its worker
+    STALE_MINUTES = 10
+
+    item = models.ForeignKey(Item, on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    crop = models.BooleanField(default=True)
+    limit = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True, db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    stage = models.CharField(max_length=20, blank=True, default="")
+    done = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    report = models.JSONField(default=list, blank=True)
+
+    def __str__(self):
+        return f"{self.created:%d/%m/%Y %H:%M} {self.item} {self.stage}"
+
+    @classmethod
+    def pending(cls):
+        """Jobs never started, or started by a worker that has since died"""
+        stale = now() - timedelta(minutes=cls.STALE_MINUTES)
+        return cls.objects.filter(
+            Q(started__isnull=True) | Q(updated__lt=stale),
+            finished__isnull=True,
+        ).order_by("created", "id")
+
+    @property
+    def percent(self):
+        return int(self.done * 100 / self.total) if self.total else 0
 
 
 class ShowPrices(ModelEnum):
@@ -610,9 +1006,85 @@ class GlobalSettings(models.Model):
         default=0, choices=ContactOptions.choices()
     )
 
+    # (version, record) shared by every request in this process
+    _cached = None
+    # Memo cleared when each request starts, so a request sees one version
+    _request = Local()
+
     @classmethod
     def record(cls):
+        """
+        The settings record, cached in the process until the version key changes
+        Treat it as read only; use load() to get a copy to edit
+        """
+        rec = getattr(cls._request, "record", None)
+        if rec is None:
+            version = get_version(GLOBAL_SETTINGS)
+            if cls._cached is None or cls._cached[0] != version:
+                cls._cached = (version, cls.load())
+            rec = cls._request.record = cls._cached[1]
+        return rec
+
+    @classmethod
+    def load(cls):
         rec = cls.objects.filter(pk=1).first()
         if rec:
             return rec
         return cls.objects.create(pk=1)
+
+    @classmethod
+    def clear_memo(cls):
+        cls._request.record = None
+
+    @classmethod
+    def invalidate(cls):
+        cls._cached = None
+        cls.clear_memo()
+        bump_version(GLOBAL_SETTINGS)
+
+
+class OutboundEmail(models.Model):
+    """
+    Email queued by a request and sent later by the send_outbox command
+    A failed message is retried with backoff until MAX_ATTEMPTS is reached
+    """
+
+    MAX_ATTEMPTS = 8
+
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    from_email = models.CharField(max_length=200)
+    to = models.CharField(max_length=500)
+    created = models.DateTimeField(auto_now_add=True)
+    next_attempt = models.DateTimeField(default=now, db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    sent = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+
+    def __str__(self):
+        return f"{self.created:%d/%m/%Y %H:%M} {self.to} {self.subject}"
+
+    @classmethod
+    def queue(cls, subject, body, to, from_email=None):
+        """Add a message to the outbox; to is a list of addresses"""
+        return cls.objects.create(
+            subject=subject,
+            body=body,
+            to=",".join(to),
+            from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        )
+
+    @classmethod
+    def pending(cls):
+        return cls.objects.filter(
+            sent__isnull=True,
+            attempts__lt=cls.MAX_ATTEMPTS,
+            next_attempt__lte=now(),
+        ).order_by("next_attempt", "id")
+
+    def failed(self, error):
+        """Record a failure and schedule a retry after 1, 2, 4 ... minutes"""
+        self.attempts += 1
+        self.error = str(error)
+        self.next_attempt = now() + timedelta(minutes=2 ** (self.attempts - 1))
+        self.save(update_fields=["attempts", "error", "next_attempt"])
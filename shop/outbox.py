@@ -0,0 +1,59 @@
+"""
+Send queued OutboundEmail messages outside the request cycle
+Views call OutboundEmail.queue() and the send_outbox command delivers them
+in batches over a single SMTP connection
+"""
+
+import logging
+
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.utils.timezone import now
+
+from shop.models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+
+def send_batch(size=50):
+    """
+    Send up to size due messages and return (sent, failed)
+    Rows are locked while sending so several workers never send the same message
+    """
+    sent = failed = 0
+    with transaction.atomic():
+        messages = OutboundEmail.pending()
+        if connection.features.has_select_for_update_skip_locked:
+            messages = messages.select_for_update(skip_locked=True)
+        messages = list(messages[:size])
+        if not messages:
+            return sent, failed
+        mail = get_connection()
+        try:
+            mail.open()
+        except Exception as e:
+            logger.warning(f"Outbox cannot connect: {e}")
+            for message in messages:
+                message.failed(e)
+            return sent, len(messages)
+        try:
+            for message in messages:
+                try:
+                    EmailMessage(
+                        subject=message.subject,
+                        body=message.body,
+                        from_email=message.from_email,
+                        to=message.to.split(","),
+                        connection=mail,
+                    ).send(fail_silently=False)
+                except Exception as e:
+                    logger.warning(f"Outbox message {message.id} failed: {e}")
+                    message.failed(e)
+                    failed += 1
+                else:
+                    message.sent = now()
+                    message.save(update_fields=["sent"])
+                    sent += 1
+        finally:
+            mail.close()
+    return sent, failed
@@ -0,0 +1,86 @@
+"""
+Rendition policy for catalogue images
+Each display spec keeps its JPEG rendition as the fallback and adds WebP, and
+AVIF when both Pillow and Wagtail can write it, at several widths for srcset.
+Large views use the bounded ZOOM rendition instead of the original upload.
+make_renditions and ingestion generate all of these; pages only use the
+renditions their views prefetched, so a request never encodes the extra formats.
+"""
+
+from functools import cache
+
+from PIL import Image
+from wagtail.images.image_operations import FormatOperation
+
+THUMB = "max-100x100"
+GRID = "max-250x250"
+DETAIL = "max-1000x1000"
+ZOOM = "max-2000x2000"
+
+# srcset widths for each display spec
+WIDTHS = {
+    GRID: [250, 500],
+    DETAIL: [500, 750, 1000],
+}
+
+MIME_TYPES = {"avif": "image/avif", "webp": "image/webp"}
+
+
+@cache
+def formats():
+    """Modern formats in order of preference"""
+    Image.init()
+    supported = getattr(FormatOperation, "supported_formats", [])
+    if "avif" in supported and "AVIF" in Image.SAVE:
+        return ["avif", "webp"]
+    return ["webp"]
+
+
+def source_specs(spec, image_format):
+    return [f"max-{width}x{width}|format-{image_format}" for width in WIDTHS[spec]]
+
+
+def specs(spec):
+    """All the filter specs used to show an image at spec"""
+    result = [spec]
+    if spec in WIDTHS:
+        for image_format in formats():
+            result += source_specs(spec, image_format)
+    return result
+
+
+def all_specs():
+    result = {}
+    for spec in (THUMB, GRID, DETAIL, ZOOM):
+        result.update(dict.fromkeys(specs(spec)))
+    return list(result)
+
+
+def prefetched(image):
+    """Renditions prefetched with the image keyed by filter spec"""
+    return {
+        rendition.filter_spec: rendition
+        for rendition in getattr(image, "prefetched_renditions", ())
+    }
+
+
+def srcsets(image, spec):
+    """
+    The fallback rendition and a {format: srcset} dict for an image at spec
+    Only prefetched renditions are used; a format with none has an empty srcset
+    and a missing fallback is the only rendition generated here.
+    Widths that repeat, because the original is small, are left out
+    """
+    available = prefetched(image)
+    fallback = available.get(spec) or image.get_rendition(spec)
+    result = {}
+    for image_format in formats() if spec in WIDTHS else []:
+        widths = set()
+        candidates = []
+        for filter_spec in source_specs(spec, image_format):
+            rendition = available.get(filter_spec)
+            if rendition and rendition.width not in widths:
+                widths.add(rendition.width)
+                candidates.append(f"{rendition.url} {rendition.width}w")
+        result[image_format] = ", ".join(candidates)
+    return fallback, result
@@ -0,0 +1,113 @@
+"""
+Site search over items and pages
+Items are returned in priority order: stock with an image, stock without,
+archive with an image, archive without; then by relevance within each group
+Everything is lazy so a results page only fetches the rows it shows
+On Postgres items are matched against the trigger maintained Item.search_vector,
+elsewhere the wagtail database backend is used
+"""
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Q, When
+from wagtail.search.backends import get_search_backend
+
+GROUPS = [
+    {"image__isnull": False, "archive": False},
+    {"image__isnull": True, "archive": False},
+    {"image__isnull": False, "archive": True},
+    {"image__isnull": True, "archive": True},
+]
+
+PRIORITY = Case(
+    *[When(then=priority, **group) for priority, group in enumerate(GROUPS)],
+    output_field=IntegerField(),
+)
+
+# Migration 0053 builds the Item.search_vector trigger with the same config,
+# so changing SEARCH_CONFIG needs that trigger recreated
+CONFIG = settings.WAGTAILSEARCH_BACKENDS["default"].get("SEARCH_CONFIG", "english")
+
+
+class ChainedResults:
+    """
+    Concatenate querysets or search results without evaluating them
+    Slicing only fetches from the sources that overlap the requested range,
+    so a Paginator over it runs one count per source and one query per page
+    """
+
+    def __init__(self, *sources):
+        self.sources = sources
+        self._counts = None
+
+    def counts(self):
+        if self._counts is None:
+            self._counts = [source.count() for source in self.sources]
+        return self._counts
+
+    def count(self):
+        return sum(self.counts())
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            results = self[key : key + 1]
+            if not results:
+                raise IndexError("ChainedResults index out of range")
+            return results[0]
+        start, stop, _ = key.indices(self.count())
+        results = []
+        offset = 0
+        for source, count in zip(self.sources, self.counts()):
+            if start < offset + count and stop > offset:
+                results.extend(source[max(start - offset, 0) : stop - offset])
+            offset += count
+            if offset >= stop:
+                break
+        return results
+
+
+def full_text():
+    """True if Item.search_vector is maintained in this database"""
+    return connection.vendor == "postgresql"
+
+
+def rank_items(query, items):
+    """Filter items on the stored search vector and annotate them with ts_rank"""
+    search_query = SearchQuery(query, config=CONFIG, search_type="websearch")
+    return items.filter(search_vector=search_query).annotate(
+        rank=SearchRank(F("search_vector"), search_query)
+    )
+
+
+def filter_items(query, items):
+    """Search for the staff item table: ranked on Postgres, substring elsewhere"""
+    if full_text():
+        return rank_items(query, items).order_by("-rank", "ref")
+    return items.filter(
+        Q(name__icontains=query)
+        | Q(ref__icontains=query)
+        | Q(description__icontains=query)
+        | Q(provenance__icontains=query)
+    )
+
+
+def search_items(query, items):
+    """
+    Search a queryset of items, ordered by priority then rank
+    On Postgres this is a single query; elsewhere the wagtail backend is
+    searched once per priority group and the groups chained lazily
+    """
+    if full_text():
+        return (
+            rank_items(query, items)
+            .annotate(priority=PRIORITY)
+            .order_by("priority", "-rank", "-pk")
+        )
+    backend = get_search_backend()
+    return ChainedResults(
+        *[backend.search(query, items.filter(**group)) for group in GROUPS]
+    )
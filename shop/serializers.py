@@ -0,0 +1,55 @@
+"""
+JSON session serializer
+The purchase wizard keeps cleaned form data in the session, so Decimals, dates
+and the unsaved items of a lot are tagged and restored on load.
+Only the models listed in MODELS are rebuilt from session data.
+"""
+
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.apps import apps
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+# Models the purchase wizard keeps unsaved in the session
+MODELS = {"shop.contact", "shop.item"}
+
+
+class SessionEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        if isinstance(o, Decimal):
+            return {"__decimal__": str(o)}
+        if isinstance(o, datetime):
+            return {"__datetime__": o.isoformat()}
+        if isinstance(o, date):
+            return {"__date__": o.isoformat()}
+        if isinstance(o, models.Model):
+            fields = {f.attname: getattr(o, f.attname) for f in o._meta.concrete_fields}
+            return {"__model__": o._meta.label_lower, "fields": fields}
+        return super().default(o)
+
+
+def decode(obj):
+    if "__decimal__" in obj:
+        return Decimal(obj["__decimal__"])
+    if "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    if "__date__" in obj:
+        return date.fromisoformat(obj["__date__"])
+    if "__model__" in obj:
+        if obj["__model__"] not in MODELS:
+            raise ValueError(f"Model {obj['__model__']} is not allowed in sessions")
+        return apps.get_model(obj["__model__"])(**obj["fields"])
+    return obj
+
+
+class SessionSerializer:
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(",", ":"), cls=SessionEncoder).encode(
+            "latin-1"
+        )
+
+    def loads(self, data):
+        return json.loads(data.decode("latin-1"), object_hook=decode)
@@ -1,7 +1,11 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.utils.timezone import now
 from django.shortcuts import redirect
 from decimal import Decimal
-from shop.models import Invoice, Item, InvoiceCharge, Contact
+from shop.models import Cart, CartLine, Invoice, InvoiceCharge, InvoiceNumber, Item
 
 # Purchase creation functions
 
@@ -134,174 +138,221 @@ def redirect_next(index, request, default):
 
 
 # Cart handling
-# cart can contain a list of items, invoicecharges and a single buyer (contact)
-# the price of items in the list can be updated but changes are not saved in the database
+# The cart is stored in the database against the staff user
+# It holds a list of items with agreed prices, invoice charges and a single buyer
+# The agreed price of an item is not saved on the item until it is invoiced
+
+# Deleting an item clears the count in a signal; the timeout
+# bounds how long any other missed change can show
+CART_COUNT_TIMEOUT = 60 * 60
 
 
 def cart_clear(request):
-    request.session["cart"] = []
-    request.session.modified = True
+    cart = _cart(request)
+    cart.lines.all().delete()
+    cart.charges.clear()
+    if cart.buyer_id:
+        cart.buyer = None
+        cart.save(update_fields=["buyer"])
+    _cart_changed(request)
     return []
 
 
 def cart_empty(request):
     """Restore state of any items in cart then clear it"""
-    cart = request.session.get("cart")
-    if cart:
-        items = cart_items(request)
-        for item in items:
-            item.state = Item.State.ON_SALE
-            item.save()
-    cart_clear(request)
+    with transaction.atomic():
+        _cart_item_set(request).update(state=Item.State.ON_SALE, updated=now())
+        cart_clear(request)
 
 
 def cart_add_item(request, item):
     if not cart_get_item(request, item.pk):
-        item.agreed_price = Decimal(0)
-        if item.sale_price is not None:
-            item.agreed_price = item.sale_price
-        else:
+        if item.sale_price is None:
             item.sale_price = Decimal(0)
+        item.agreed_price = item.sale_price
         item.state = Item.State.RESERVED
         item.save()
-        cart = _cart(request)
-        cart.append(item)
-        request.session["cart"] = cart
-        request.session.modified = True
+        CartLine.objects.create(
+            cart=_cart(request), item=item, agreed_price=item.agreed_price
+        )
+        _cart_changed(request)
 
 
 def cart_get_item(request, pk):
-    return _cart_get_object(request, pk, Item)
+    line = _cart(request).lines.select_related("item").filter(item_id=int(pk)).first()
+    return _line_item(line) if line else None
+
+
+def cart_set_price(request, pk, agreed_price):
+    _cart(request).lines.filter(item_id=int(pk)).update(agreed_price=agreed_price)
 
 
 def cart_remove_item(request, pk):
     item = cart_get_item(request, pk)
     if item:
-        _cart(request).remove(item)
+        _cart(request).lines.filter(item=item).delete()
         item.state = Item.State.ON_SALE
         item.save()
-        request.session.modified = True
+        _cart_changed(request)
 
 
 def cart_items(request):
-    return _cart_contents(request, Item)
+    lines = _cart(request).lines.select_related("item").order_by("id")
+    return [_line_item(line) for line in lines]
+
+
+def cart_count(request):
+    """Number of items in the cart, cached so the navbar runs no query"""
+    key = cart_count_key(request.user.pk)
+    count = cache.get(key)
+    if count is None:
+        count = CartLine.objects.filter(cart__user=request.user).count()
+        cache.set(key, count, CART_COUNT_TIMEOUT)
+    return count
+
+
+def cart_count_key(user_id):
+    return f"cart_count:{user_id}"
 
 
 def cart_add_charge(request, charge):
-    if not cart_get_charge(request, charge.pk):
-        cart = _cart(request)
-        cart.append(charge)
-        request.session["cart"] = cart
-        request.session.modified = True
+    _cart(request).charges.add(charge)
 
 
 def cart_get_charge(request, pk):
-    return _cart_get_object(request, pk, InvoiceCharge)
+    return _cart(request).charges.filter(pk=int(pk)).first()
 
 
 def cart_remove_charge(request, pk):
-    charge = cart_get_charge(request, pk)
-    if charge:
-        _cart(request).remove(charge)
-        request.session.modified = True
+    _cart(request).charges.remove(int(pk))
 
 
 def cart_charges(request):
-    return _cart_contents(request, InvoiceCharge)
+    return list(_cart(request).charges.order_by("id"))
 
 
 def cart_add_buyer(request, contact):
-    existing = cart_get_buyer(request)
-    if existing:
-        _cart(request).remove(existing)
-    _cart(request).append(contact)
-    request.session.modified = True
+    cart = _cart(request)
+    cart.buyer = contact
+    cart.save(update_fields=["buyer"])
 
 
 def cart_get_buyer(request):
-    count = 0
-    for thing in _cart(request):
-        if thing._meta.object_name == Contact._meta.object_name:
-            count += 1
-            result = thing
-    if count:
-        if count > 1:
-            raise ValueError("Muliple buyers stored in session")
-        return result
-    return None
+    return _cart(request).buyer
 
 
 def cart_session_to_invoice(request, date=None):
     """
-    Create an invoice from cart session data
+    Create an invoice from the cart
     If date is none, its a proforma invoice
+    Items and charges are updated with one query each, whatever the cart size
     """
 
-    if date:
-        proforma = False
-        number = Invoice.next_number()
-    else:
-        date = now()
-        proforma = True
-        number = 0
-    invoice = Invoice(date=date, proforma=proforma, number=number)
-    invoice.buyer = cart_get_buyer(request)
-    invoice.address = invoice.buyer.main_address
-    invoice.save()
-    total = Decimal(0)
-    for item in cart_items(request):
-        total += item.agreed_price
-        item.sale_price = item.agreed_price
-        item.state = Item.State.SOLD
-        item.invoice = invoice
-        item.archive = True
-        item.save()
-    for charge in cart_charges(request):
-        total += charge.amount
-        charge.invoice = invoice
-        charge.save()
-    invoice.total = total
-    invoice.save()
-    cart_clear(request)
+    cart = _cart(request)
+    with transaction.atomic():
+        if date:
+            proforma = False
+            number = InvoiceNumber.get_next()
+        else:
+            date = now()
+            proforma = True
+            number = 0
+        invoice = Invoice.objects.create(
+            date=date,
+            proforma=proforma,
+            number=number,
+            buyer=cart.buyer,
+            address=cart.buyer.main_address,
+            total=_cart_total(cart),
+        )
+        agreed_price = cart.lines.filter(item=OuterRef("pk")).values("agreed_price")
+        _cart_item_set(request).update(
+            sale_price=Subquery(agreed_price[:1]),
+            state=Item.State.SOLD,
+            invoice=invoice,
+            archive=True,
+            updated=now(),
+        )
+        cart.charges.update(invoice=invoice)
+        cart_clear(request)
     return invoice
 
 
 def cart_invoice_to_session(request, invoice):
     """
-    Create session representation of a proforma invoice
-    Then delete the invoice and charges
+    Move a proforma invoice back into the cart
+    Then delete the invoice
     """
-    cart_clear(request)
-    for item in invoice.item_set.all():
-        item.invoice = None
-        item.save()
-        cart_add_item(request, item)
-    for charge in invoice.invoicecharge_set.all():
-        charge.invoice = None
-        cart_add_charge(request, charge)
-        charge.delete()
-    cart_add_buyer(request, invoice.buyer)
-    invoice.delete()
+    with transaction.atomic():
+        cart_clear(request)
+        cart = _cart(request)
+        items = invoice.item_set.all()
+        CartLine.objects.bulk_create(
+            CartLine(cart=cart, item_id=pk, agreed_price=price or 0)
+            for pk, price in items.values_list("pk", "sale_price")
+        )
+        items.update(
+            invoice=None,
+            state=Item.State.RESERVED,
+            sale_price=Coalesce("sale_price", Value(Decimal(0))),
+            updated=now(),
+        )
+        charges = invoice.invoicecharge_set.all()
+        cart.charges.add(*charges.values_list("pk", flat=True))
+        charges.update(invoice=None)
+        cart_add_buyer(request, invoice.buyer)
+        invoice.delete()
+        _cart_changed(request)
 
 
 # private support code
 def _cart(request):
-    cart = request.session.get("cart", None)
-    if cart is None:
-        cart = cart_clear(request)
+    """The user's cart, fetched once per request"""
+    cart = getattr(request, "_cart", None)
+    if cart is None or cart.user_id != request.user.pk:
+        cart = Cart.objects.select_related("buyer").filter(user=request.user).first()
+        if cart is None:
+            cart = Cart.objects.create(user=request.user)
+        request._cart = cart
     return cart
 
 
-def _cart_get_object(request, pk, cls):
-    pk = int(pk)
-    cart = _cart(request)
-    if cart:
-        for thing in cart:
-            if thing.pk == pk and thing._meta.object_name == cls._meta.object_name:
-                return thing
-    return None
+def _cart_item_set(request):
+    return Item.objects.filter(cartline__cart=_cart(request))
 
 
-def _cart_contents(request, cls):
-    cart = _cart(request)
-    return [obj for obj in cart if obj._meta.object_name == cls._meta.object_name]
+def _cart_total(cart):
+    """Sum of agreed prices and charges in a single query"""
+    lines = (
+        CartLine.objects.filter(cart=cart)
+        .order_by()
+        .values("cart")
+        .annotate(total=Sum("agreed_price"))
+        .values("total")
+    )
+    charges = (
+        InvoiceCharge.objects.filter(cart=cart)
+        .order_by()
+        .values("cart")
+        .annotate(total=Sum("amount"))
+        .values("total")
+    )
+    zero = Value(Decimal(0))
+    return (
+        Cart.objects.filter(pk=cart.pk)
+        .annotate(
+            total=Coalesce(Subquery(lines), zero) + Coalesce(Subquery(charges), zero)
+        )
+        .values_list("total", flat=True)
+        .get()
+    )
+
+
+def _cart_changed(request):
+    cache.delete(cart_count_key(request.user.pk))
+
+
+def _line_item(line):
+    item = line.item
+    item.agreed_price = line.agreed_price
+    return item
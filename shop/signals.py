@@ -0,0 +1,97 @@
+"""
+Keep the denormalised item counts on Category current when items change
+Bulk updates are handled by ItemQuerySet.update()
+Also invalidate the cached GlobalSettings record, item pages, grid page keys
+and cart counts. Images and books shown on an item page touch its items
+"""
+
+from django.core.cache import cache
+from django.core.signals import request_started
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from shop.cache import ITEMS, bump_version
+from shop.models import (
+    Book,
+    Cart,
+    Category,
+    CustomImage,
+    GlobalSettings,
+    Item,
+    count_changes,
+)
+from shop.session import cart_count_key
+
+
+@receiver(pre_save, sender=Item)
+def item_pre_save(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    instance._counts_before = (
+        Item.objects.filter(pk=instance.pk).category_counts() if instance.pk else {}
+    )
+
+
+@receiver(post_save, sender=Item)
+def item_post_save(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    after = Item.objects.filter(pk=instance.pk).category_counts()
+    Category.objects.adjust_counts(count_changes(instance._counts_before, after))
+    bump_version(ITEMS)
+
+
+@receiver(pre_delete, sender=Item)
+def item_pre_delete(sender, instance, **kwargs):
+    instance._counts_before = Item.objects.filter(pk=instance.pk).category_counts()
+    # The item's cart lines are deleted with it, outside the cart functions
+    users = Cart.objects.filter(lines__item=instance).values_list("user_id", flat=True)
+    cache.delete_many([cart_count_key(user_id) for user_id in users])
+
+
+@receiver(post_delete, sender=Item)
+def item_post_delete(sender, instance, **kwargs):
+    Category.objects.adjust_counts(count_changes(instance._counts_before, {}))
+    bump_version(ITEMS)
+
+
+@receiver(post_save, sender=CustomImage)
+def image_post_save(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    instance.touch_items()
+
+
+@receiver(pre_delete, sender=CustomImage)
+def image_pre_delete(sender, instance, **kwargs):
+    # Deleting an image sets Item.image to null without sending item signals
+    instance._counts_before = Item.objects.filter(image=instance).category_counts()
+    instance.touch_items()
+
+
+@receiver(post_delete, sender=CustomImage)
+def image_post_delete(sender, instance, **kwargs):
+    Category.objects.adjust_counts(count_changes(instance._counts_before, {}))
+
+
+@receiver(post_save, sender=Book)
+def book_post_save(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    instance.touch_items()
+
+
+@receiver(pre_delete, sender=Book)
+def book_pre_delete(sender, instance, **kwargs):
+    # Deleting a book sets Item.book to null without sending item signals
+    instance.touch_items()
+
+
+@receiver(post_save, sender=GlobalSettings)
+def settings_post_save(sender, instance, **kwargs):
+    GlobalSettings.invalidate()
+
+
+@receiver(request_started)
+def clear_settings_memo(sender, **kwargs):
+    GlobalSettings.clear_memo()
@@ -19,7 +19,14 @@ from shop.models import (
 class CategoryTable(tables.Table):
     class Meta:
         model = Category
-        fields = ("name", "parent", "description", "image", "count")
+        fields = (
+            "name",
+            "parent",
+            "description",
+            "image",
+            "shop_count",
+            "archive_count",
+        )
         attrs = {"class": "table table-sm table-responsive table-hover hover-link"}
         row_attrs = {
             "data-url": lambda record: reverse(
@@ -41,9 +48,10 @@ class CategoryTable(tables.Table):
 
 
 class ImageColumn(tables.Column):
-    @staticmethod
-    def render(value):
-        image = value.get_rendition("max-100x100")
+    spec = "max-100x100"
+
+    def render(self, value):
+        image = value.get_rendition(self.spec)
         return mark_safe(f'<img src="{image.file.url}">')
 
 
@@ -81,11 +89,19 @@ class ItemTable(tables.Table):
     image = ImageColumn(accessor="image", verbose_name="Image")
     images = tables.Column(accessor="id", verbose_name="Photos")
     selection = SelectionColumn()
+    thumbnail_spec = ImageColumn.spec
 
     @staticmethod
     def render_images(record):
+        # ItemTableView annotates the count when the column is visible
+        if hasattr(record, "image_count"):
+            return record.image_count
         return CustomImage.objects.filter(item=record).count()
 
+    @staticmethod
+    def value_image(value):
+        return value.title
+
 
 class ContactTable(tables.Table):
     class Meta:
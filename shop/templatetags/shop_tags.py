@@ -1,10 +1,10 @@
-import markdown
-from bs4 import BeautifulSoup
 from django import template
+from django.utils.html import format_html, format_html_join
 from django.utils.safestring import mark_safe
 from django.template.defaultfilters import title
-from shop.session import cart_items
+from shop import renditions, session
 from shop.cat_tree import tree
+from shop.text import markdown_text
 from django.contrib import humanize
 
 register = template.Library()
@@ -159,8 +159,9 @@ def currency_input(
 @register.simple_tag(takes_context=True)
 def cart_count(context):
     request = context["request"]
-    if cart_items(request):
-        output = f'<span class ="cart-badge">{len(cart_items(request))}</span>'
+    count = session.cart_count(request) if request.user.is_authenticated else 0
+    if count:
+        output = f'<span class ="cart-badge">{count}</span>'
         return mark_safe(output)
     return ""
 
@@ -172,6 +173,41 @@ def integer(value):
 
 @register.filter(name="unmarkdown")
 def unmarkdown(text):
-    html = markdown.markdown(text)
-    soup = BeautifulSoup(html, features="html.parser")
-    return soup.get_text()
+    """Prefer Item.description_text, which is stored when the item is saved"""
+    return markdown_text(text)
+
+
+@register.simple_tag(takes_context=False)
+def picture(image, spec, sizes="100vw", **attrs):
+    """
+    <picture> with srcsets in modern formats and the JPEG rendition as fallback
+    Keyword arguments are added to the img
+    """
+    if not image:
+        return ""
+    fallback, srcsets = renditions.srcsets(image, spec)
+    sources = format_html_join(
+        "",
+        '<source type="{}" srcset="{}" sizes="{}" data-format="{}">',
+        (
+            (renditions.MIME_TYPES[image_format], srcset, sizes, image_format)
+            for image_format, srcset in srcsets.items()
+            if srcset
+        ),
+    )
+    return format_html("<picture>{}{}</picture>", sources, fallback.img_tag(attrs))
+
+
+@register.simple_tag(takes_context=False)
+def picture_data(image, spec):
+    """Attributes of a thumbnail that swaps the main picture to this image"""
+    fallback, srcsets = renditions.srcsets(image, spec)
+    return format_html_join(
+        " ",
+        '{}="{}"',
+        [("full", fallback.url)]
+        + [
+            (f"data-srcset-{image_format}", srcset)
+            for image_format, srcset in srcsets.items()
+        ],
+    )
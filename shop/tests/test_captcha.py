@@ -0,0 +1,92 @@
+import pytest
+import requests
+from django.core.cache import cache
+from django.urls import reverse
+from shop import captcha
+from shop.captcha import StubCaptchaClient
+from shop.models import ContactOptions, Enquiry, GlobalSettings, OutboundEmail
+
+
+class CountingClient(StubCaptchaClient):
+    checks = 0
+
+    def check(self, option, token, remote_ip):
+        self.checks += 1
+        return super().check(option, token, remote_ip)
+
+
+class TimeoutClient(StubCaptchaClient):
+    def check(self, option, token, remote_ip):
+        raise requests.Timeout("read timed out")
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+def test_stub_client():
+    client = StubCaptchaClient()
+    assert client.verify(ContactOptions.USE_HCAPTCHA, "token")
+    assert not client.verify(ContactOptions.USE_HCAPTCHA, "fail")
+    assert not client.verify(ContactOptions.USE_HCAPTCHA, "")
+    assert client.metrics["calls"] == 2
+
+
+def test_verified_token_is_memoised():
+    client = CountingClient()
+    assert client.verify(ContactOptions.USE_RECAPTCHA, "token")
+    assert client.verify(ContactOptions.USE_RECAPTCHA, "token")
+    assert client.checks == 1
+
+
+def test_timeout_is_invalid():
+    client = TimeoutClient()
+    assert not client.verify(ContactOptions.USE_HCAPTCHA, "token")
+    assert client.metrics["errors"] == 1
+    assert not client.verify(ContactOptions.USE_HCAPTCHA, "token")
+    assert client.metrics["errors"] == 2
+
+
+class ErrorSession:
+    """Stands in for the HTTP session and returns a body without success"""
+
+    def post(self, url, values, timeout):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'{"error-codes": ["invalid-input-secret"]}'
+        return response
+
+
+def test_error_body_is_invalid(settings):
+    settings.HCAPTCHA_SECRET_KEY = "secret"
+    client = captcha.CaptchaClient()
+    client.session = ErrorSession()
+    assert not client.verify(ContactOptions.USE_HCAPTCHA, "token")
+    assert client.metrics["errors"] == 1
+
+
+def test_enquiry_with_stub_client(client, db, settings):
+    settings.CAPTCHA_CLIENT = "shop.captcha.StubCaptchaClient"
+    settings.STORAGES = {
+        **settings.STORAGES,
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+        },
+    }
+    captcha._client = None
+    GlobalSettings.objects.create(pk=1, contact_options=ContactOptions.USE_HCAPTCHA)
+    data = {
+        "first_name": "Ann",
+        "last_name": "Other",
+        "email": "ann@example.com",
+        "subject": "Question",
+        "message": "Hello",
+        "h-captcha-response": "token",
+        settings.HONEYPOT_FIELD_NAME: "",
+    }
+    response = client.post(reverse("general_enquiry"), data, HTTP_HX_REQUEST="true")
+    captcha._client = None
+    assert response.status_code == 200
+    assert Enquiry.objects.count() == 1
+    assert OutboundEmail.objects.count() == 2
@@ -1,6 +1,13 @@
 import pytest
+from django.core.cache import cache
 from shop.cat_tree import *
-from shop.models import Item
+from shop.models import CustomImage, Item
+from wagtail.models import Collection
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
 
 
 def test_tree(fix_tree):
@@ -8,6 +15,111 @@ def test_tree(fix_tree):
     print_tree()
 
 
+def test_tree_structure(fix_tree):
+    t = tree()
+    assert [kid["text"] for kid in t["children"]] == ["A", "B", "F", "G", "K"]
+    assert [kid["text"] for kid in t["children"][1]["children"]] == ["C", "D", "E"]
+    assert t["children"][1]["leaf"] is False
+    assert t["children"][1]["children"][0]["leaf"] is True
+    assert t["children"][1]["children"][0]["link"] == "/catalogue/b/c"
+
+
+def test_archive_tree_links(fix_tree):
+    t = tree(archive=True)
+    assert t["children"][1]["children"][0]["link"] == "/archive/b/c"
+    assert t["children"][1]["children"][0]["archive"] is True
+
+
+def test_tree_is_cached(fix_tree, django_assert_num_queries):
+    with django_assert_num_queries(2):
+        cold = tree(root="B")
+    with django_assert_num_queries(0):
+        warm = tree(root="B")
+    assert warm == cold
+
+
+def test_post_save_invalidates_tree(fix_tree):
+    tree()
+    node = Category.objects.get(name="A")
+    node.short_name = "Renamed"
+    node.save()
+    node.post_save()
+    assert tree()["children"][0]["text"] == "Renamed"
+
+
+def test_delete_invalidates_tree(fix_tree):
+    tree()
+    Category.objects.get(name="F").delete()
+    assert [kid["text"] for kid in tree()["children"]] == ["A", "B", "G", "K"]
+
+
+def test_tree_move_invalidates_tree(fix_tree):
+    tree()
+    node = Category.objects.get(name="A")
+    target = Category.objects.get(name="K")
+    root = Category.objects.get(name="Catalogue")
+    tree_move(node.id, target.id, root.id, False)
+    assert [kid["text"] for kid in tree()["children"]] == ["B", "F", "G", "K", "A"]
+
+
+def test_breadcrumb_without_queries(fix_tree, django_assert_num_queries):
+    node = Category.objects.get(name="C")
+    with django_assert_num_queries(0):
+        breadcrumb = node.breadcrumb_nodes(item_view=True)
+        links = [crumb.get_absolute_url() for crumb in breadcrumb]
+    assert [crumb.name for crumb in breadcrumb] == ["Catalogue", "B", "C"]
+    assert links == ["/catalogue/", "/catalogue/b/", "/catalogue/b/c/"]
+    assert not any(crumb.active for crumb in breadcrumb)
+
+
+def test_seo_prefix(fix_tree):
+    root = Category.objects.get(name="Catalogue")
+    chinese = root.add_child(name="Chinese")
+    chinese.post_save()
+    bowls = Category.objects.get(pk=chinese.pk).add_child(name="Chinese Bowls")
+    bowls.post_save()
+    assert Category.objects.get(pk=bowls.pk).seo_prefix == "Antique Chinese Bowls"
+
+
+def test_tree_move_updates_ancestors(fix_tree):
+    node = Category.objects.get(name="C")
+    target = Category.objects.get(name="G")
+    previous = Category.objects.get(name="B")
+    tree_move(node.id, target.id, previous.id, True)
+    node = Category.objects.get(name="C")
+    assert node.slug == "catalogue/g/c"
+    assert [crumb.name for crumb in node.breadcrumb_nodes()] == ["Catalogue", "G", "C"]
+    assert node.seo_prefix == "Antique G C"
+
+
+def test_admin_tree_counts(fix_tree):
+    if not Collection.get_first_root_node():
+        Collection.add_root(name="Root")
+    image = CustomImage.objects.create(
+        title="image", file="original_images/image.jpg", width=10, height=10
+    )
+    leaf = Category.objects.get(name="C")
+    Item.objects.create(name="Shop", category=leaf, image=image)
+    Item.objects.create(
+        name="Archive", category=leaf, image=image, library=Item.Library.ARCHIVE
+    )
+    Item.objects.create(name="No image", category=leaf)
+    t = json.loads(tree_json())[0]
+    assert t["children"][1]["children"][0]["items"] == 2
+    assert t["children"][1]["children"][0]["archive"] == 1
+    assert t["children"][1]["items"] == 0
+
+
+@pytest.mark.parametrize("size", [1, 5, 25])
+def test_admin_tree_query_count(fix_tree, size, django_assert_num_queries):
+    node = Category.objects.get(name="K")
+    for i in range(size):
+        node = Category.objects.get(pk=node.pk).add_child(name=f"K{i}", sequence=1)
+    tree()
+    with django_assert_num_queries(3):
+        tree_json()
+
+
 @pytest.fixture()
 def fix_tree(db):
     alphabet = "ABCDEFGHIJKLMNOP"
@@ -20,6 +132,7 @@ def fix_tree(db):
             for j in range(3):
                 node.add_child(name=alphabet[a])
                 a += 1
+    root.post_save()
 
 
 class Move:
@@ -0,0 +1,79 @@
+import io
+
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from openpyxl import load_workbook
+from wagtail.models import Collection
+from shop.models import Category, CustomImage, Item
+
+
+@pytest.fixture
+def staff_client(client, db):
+    client.force_login(User.objects.create_user("staff", is_staff=True))
+    return client
+
+
+def make_items(count):
+    if not Collection.get_first_root_node():
+        Collection.add_root(name="Root")
+    category = Category.add_root(name="Catalogue")
+    for i in range(count):
+        item = Item.objects.create(name=f"Bowl {i}", ref=f"A{i:03d}", category=category)
+        CustomImage.objects.create(
+            title=f"Bowl {i}",
+            file="original_images/bowl.jpg",
+            width=10,
+            height=10,
+            item=item,
+        )
+
+
+def export(client, export_format, subset=""):
+    url = reverse("item_list") + f"?archive=&_export={export_format}"
+    if subset:
+        url += f"&_subset={subset}"
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+        content = b"".join(response) if response.streaming else response.content
+    return content, len(queries)
+
+
+def test_csv_export_streams_rows(staff_client):
+    make_items(3)
+    content, _ = export(staff_client, "csv")
+    lines = content.decode().splitlines()
+    assert len(lines) == 4
+    assert lines[1].startswith("A000")
+
+
+def test_xlsx_export(staff_client):
+    make_items(3)
+    content, _ = export(staff_client, "xlsx")
+    sheet = load_workbook(io.BytesIO(content)).active
+    rows = list(sheet.values)
+    assert len(rows) == 4
+    assert rows[1][0] == "A000"
+
+
+def test_export_queries_do_not_depend_on_rows(staff_client):
+    make_items(2)
+    _, few = export(staff_client, "csv")
+    make_items(10)
+    _, many = export(staff_client, "csv")
+    assert few == many
+
+
+def test_export_subsets(staff_client):
+    make_items(3)
+    session = staff_client.session
+    session["selected_ids"] = [Item.objects.get(ref="A001").pk]
+    session.save()
+    content, _ = export(staff_client, "csv", "selected")
+    lines = content.decode().splitlines()
+    assert len(lines) == 2
+    assert lines[1].startswith("A001")
+    content, _ = export(staff_client, "csv", "all")
+    assert len(content.decode().splitlines()) == 4
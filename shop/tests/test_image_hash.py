@@ -0,0 +1,122 @@
+import hashlib
+import io
+import random
+
+import pytest
+from PIL import Image
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from wagtail.models import Collection
+from shop.image_hash import (
+    MAX_BITS,
+    band_index,
+    band_keys,
+    distance,
+    image_hashes,
+    perceptual_hash,
+    similar,
+    similar_pairs,
+)
+from shop.models import CustomImage
+
+
+def picture_of(width, height):
+    """Random smooth picture, which like a photograph survives downscaling"""
+    noise = Image.effect_noise((8, 6), 100).convert("RGB")
+    return noise.resize((width, height), Image.BICUBIC)
+
+
+def test_perceptual_hash_survives_resizing(tmp_path):
+    picture = picture_of(800, 600)
+    picture.save(tmp_path / "large.jpg", quality=90)
+    picture.resize((200, 150)).save(tmp_path / "small.jpg", quality=50)
+    picture_of(800, 600).save(tmp_path / "other.jpg")
+    large = perceptual_hash(tmp_path / "large.jpg")
+    assert distance(large, perceptual_hash(tmp_path / "small.jpg")) <= 6
+    assert distance(large, perceptual_hash(tmp_path / "other.jpg")) > 6
+    assert (
+        image_hashes(tmp_path / "large.jpg")[0]
+        != image_hashes(tmp_path / "small.jpg")[0]
+    )
+
+
+def test_similar_pairs_matches_brute_force():
+    rng = random.Random(1)
+    hashes = []
+    for id in range(300):
+        if id % 3 and hashes:
+            # Flip a few bits of an earlier hash
+            value = int(rng.choice(hashes)[1], 16)
+            for bit in rng.sample(range(64), rng.randint(0, 8)):
+                value ^= 1 << bit
+        else:
+            value = rng.getrandbits(64)
+        hashes.append((id, f"{value:016x}"))
+    expected = sorted(
+        (a, b)
+        for i, (a, first) in enumerate(hashes)
+        for b, second in hashes[i + 1 :]
+        if distance(first, second) <= 6
+    )
+    assert similar_pairs(hashes, 6) == expected
+    index = band_index((phash, id) for id, phash in hashes)
+    assert sorted(
+        (min(id, other), max(id, other))
+        for id, phash in hashes
+        for _, other in similar(phash, index, 6)
+        if other != id
+    ) == sorted(expected * 2)
+
+
+def test_bits_are_limited_to_what_the_bands_find(db):
+    with pytest.raises(ValueError):
+        similar_pairs([], MAX_BITS + 1)
+    with pytest.raises(CommandError):
+        call_command("hash_images", "--bits", str(MAX_BITS + 1))
+
+
+def test_upload_is_hashed_once_stored(db, settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    if not Collection.get_first_root_node():
+        Collection.add_root(name="Root")
+    buffer = io.BytesIO()
+    picture_of(200, 150).save(buffer, "JPEG")
+    content = buffer.getvalue()
+    image = CustomImage.objects.create(
+        title="upload",
+        file=SimpleUploadedFile("upload.jpg", content),
+        width=200,
+        height=150,
+    )
+    stored = CustomImage.objects.get(pk=image.pk)
+    assert stored.file_hash == hashlib.sha1(content).hexdigest()
+    assert stored.phash == perceptual_hash(stored.file.path)
+    assert sorted(stored.bands.values_list("key", flat=True)) == sorted(
+        band_keys(stored.phash)
+    )
+
+
+def test_hash_images_backfills_and_reports(db, settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    (tmp_path / "original_images").mkdir()
+    if not Collection.get_first_root_node():
+        Collection.add_root(name="Root")
+    picture = picture_of(200, 150)
+    for name in ("a", "b"):
+        picture.save(tmp_path / f"original_images/{name}.jpg")
+    images = [
+        CustomImage.objects.create(
+            title=name, file=f"original_images/{name}.jpg", width=200, height=150
+        )
+        for name in ("a", "b", "missing")
+    ]
+    CustomImage.objects.update(file_hash="", phash="")
+    out = io.StringIO()
+    call_command("hash_images", "--report", stdout=out)
+    a, b, missing = [CustomImage.objects.get(pk=image.pk) for image in images]
+    assert a.phash and a.file_hash == b.file_hash
+    assert missing.phash == ""
+    output = out.getvalue()
+    assert "2 images hashed, 1 errors" in output
+    assert "1 sets of duplicates" in output
+    assert f"{a.id} ~ {b.id}" in output
@@ -0,0 +1,186 @@
+import os
+
+import pytest
+from PIL import Image
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils.timezone import now
+from wagtail.models import Collection
+from shop import ingest, renditions
+from shop.models import CustomImage, IngestJob, Item, Photo
+
+
+def picture_of(width, height):
+    """Random smooth picture, which like a photograph survives downscaling"""
+    noise = Image.effect_noise((8, 6), 100).convert("RGB")
+    return noise.resize((width, height), Image.BICUBIC)
+
+
+@pytest.fixture
+def media(db, settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    settings.STORAGES = {
+        **settings.STORAGES,
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+        },
+    }
+    for folder in ("photos", "original_images", "images"):
+        os.makedirs(tmp_path / folder)
+    if not Collection.get_first_root_node():
+        Collection.add_root(name="Root")
+    cache.clear()
+    return tmp_path
+
+
+def make_photos(media, user, count):
+    for i in range(count):
+        name = f"{user.username}{i}.jpg"
+        picture = picture_of(400, 300)
+        picture.save(media / "photos" / name)
+        Photo.objects.create(title=name, file=f"photos/{name}", user=user)
+
+
+def run(item, user, crop, limit, workers=1):
+    job = ingest.queue_ingestion(item, user, crop, limit)
+    return ingest.ingest_photos(job, workers)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_ingest_photos(media, workers):
+    user = User.objects.create_user("staff", is_staff=True)
+    other = User.objects.create_user("other", is_staff=True)
+    item = Item.objects.create(name="Bowl", ref="A1")
+    make_photos(media, user, 3)
+    make_photos(media, other, 1)
+    images = run(item, user, crop=True, limit=200, workers=workers)
+    assert len(images) == 3
+    assert CustomImage.objects.filter(item=item).count() == 3
+    image = CustomImage.objects.filter(item=item).first()
+    assert (image.width, image.height) == (200, 150)
+    assert image.title == "A1 Bowl"
+    assert image.renditions.count() == len(renditions.all_specs())
+    # Only the ingesting user's photos are removed
+    assert list(Photo.objects.values_list("user", flat=True)) == [other.pk]
+    assert sorted(os.listdir(media / "photos")) == ["ingest", "other0.jpg"]
+    assert os.listdir(media / "photos" / "ingest") == []
+    assert ingest.get_progress(user, item).finished
+
+
+def test_images_page_processes_photos(media, client):
+    user = User.objects.create_user("staff", is_staff=True)
+    client.force_login(user)
+    item = Item.objects.create(name="Bowl", ref="A1")
+    make_photos(media, user, 2)
+    url = reverse("item_images", kwargs={"pk": item.pk})
+    response = client.post(
+        url,
+        {"crop": "on", "limit": "100"},
+        HTTP_HX_REQUEST="true",
+        HTTP_HX_TRIGGER_NAME="process",
+    )
+    assert b"ingest-progress" in response.content
+    assert CustomImage.objects.filter(item=item).count() == 0
+    # Processing happens in the worker, not the request
+    call_command("ingest_photos", "--workers", "1")
+    assert CustomImage.objects.filter(item=item).count() == 2
+    response = client.get(url, HTTP_HX_REQUEST="true", HTTP_HX_TRIGGER_NAME="progress")
+    assert response.headers["HX-Refresh"] == "true"
+
+
+def test_abandoned_job_is_run_again(media):
+    user = User.objects.create_user("staff", is_staff=True)
+    item = Item.objects.create(name="Bowl", ref="A1")
+    make_photos(media, user, 1)
+    job = ingest.queue_ingestion(item, user, True, 100)
+    assert ingest.claim_job() == job
+    assert ingest.claim_job() is None
+    # The worker died without finishing
+    stale = now() - timedelta(minutes=IngestJob.STALE_MINUTES + 1)
+    IngestJob.objects.filter(pk=job.pk).update(updated=stale)
+    job = ingest.claim_job()
+    assert job.attempts == 2
+    ingest.run_job(job, workers=1)
+    assert ingest.get_progress(user, item).stage == "Done"
+    assert not ingest.is_running(user)
+    assert CustomImage.objects.filter(item=item).count() == 1
+
+
+def test_existing_original_with_same_name_is_kept(media):
+    user = User.objects.create_user("staff", is_staff=True)
+    item = Item.objects.create(name="Bowl", ref="A1")
+    picture_of(300, 200).save(media / "original_images" / "staff0.jpg")
+    existing = (media / "original_images" / "staff0.jpg").read_bytes()
+    make_photos(media, user, 1)
+    # Two photos with the same name in one batch
+    picture_of(400, 300).save(media / "photos" / "again.jpg")
+    Photo.objects.create(title="staff0.jpg", file="photos/again.jpg", user=user)
+    images = run(item, user, crop=False, limit=0, workers=2)
+    names = [image.file.name for image in images]
+    assert len(set(names)) == 2
+    assert "original_images/staff0.jpg" not in names
+    assert (media / "original_images" / "staff0.jpg").read_bytes() == existing
+
+
+@pytest.mark.parametrize(
+    "size, crop, limit, expected",
+    [
+        ((4000, 3000), True, 1000, (1000, 750)),
+        ((3000, 4000), True, 1000, (750, 1000)),
+        ((4000, 3800), True, 1000, (1000, 1000)),
+        ((4000, 3800), False, 1000, (1000, 950)),
+        ((2000, 2000), True, 0, (2000, 2000)),
+        ((2000, 2000), True, 500, (500, 500)),
+    ],
+)
+def test_resize(tmp_path, size, crop, limit, expected):
+    path = tmp_path / "photo.jpg"
+    Image.new("RGB", size, "blue").save(path)
+    with Image.open(path) as image:
+        assert ingest.resize(image, crop, limit).size == expected
+
+
+def test_resize_applies_orientation_and_decodes_jpeg_in_draft(tmp_path):
+    path = tmp_path / "photo.jpg"
+    exif = Image.Exif()
+    exif[ingest.ORIENTATION] = 6
+    Image.new("RGB", (4000, 3000), "blue").save(path, exif=exif)
+    with Image.open(path) as image:
+        im = ingest.resize(image, False, 500)
+        # Decoded at 1/8 scale, which still covers the 500 px output
+        assert image.size == (500, 375)
+    assert im.size == (375, 500)
+
+
+def test_duplicates_are_skipped_and_similar_reported(media):
+    user = User.objects.create_user("staff", is_staff=True)
+    item = Item.objects.create(name="Bowl", ref="A1")
+    picture = picture_of(400, 300)
+
+    def upload(name, quality=90):
+        picture.save(media / "photos" / name, quality=quality)
+        Photo.objects.create(title=name, file=f"photos/{name}", user=user)
+
+    upload("bowl.jpg")
+    first = run(item, user, crop=False, limit=0)[0]
+    assert first.file_hash and first.phash
+    # The same photo again, a copy under another name and a re-encoded copy
+    upload("bowl.jpg")
+    upload("copy.jpg")
+    upload("similar.jpg", quality=40)
+    images = run(item, user, crop=False, limit=0)
+    assert [image.file.name for image in images] == ["original_images/similar.jpg"]
+    report = ingest.get_progress(user, item).report
+    assert len(report) == 3
+    assert "bowl.jpg was skipped" in report[0]
+    assert "copy.jpg was skipped" in report[1]
+    assert report[2] == "similar.jpg looks like A1 Bowl"
+    # The existing original is kept, the duplicate copy removed
+    assert sorted(os.listdir(media / "original_images")) == [
+        "bowl.jpg",
+        "similar.jpg",
+    ]
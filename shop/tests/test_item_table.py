@@ -0,0 +1,94 @@
+import pytest
+from datetime import date
+from django.contrib.auth.models import User
+from django.db import connection
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from wagtail.models import Collection
+from shop.models import (
+    Category,
+    CustomImage,
+    CustomRendition,
+    Item,
+    Lot,
+    Purchase,
+)
+from shop.views import item_views
+from shop.views.item_views import ItemTableView
+
+ROWS = ItemTableView().rows_list()
+
+
+@pytest.fixture
+def items(client, db, settings):
+    settings.STORAGES = {
+        **settings.STORAGES,
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+        },
+    }
+    client.force_login(User.objects.create_user("staff", is_staff=True))
+    if not Collection.get_first_root_node():
+        Collection.add_root(name="Root")
+    category = Category.add_root(name="Catalogue")
+    lot = Lot.objects.create(
+        number="1", purchase=Purchase.objects.create(date=date.today())
+    )
+    for i in range(max(ROWS)):
+        item = Item.objects.create(
+            name=f"Bowl {i}", ref=f"A{i:03d}", category=category, lot=lot
+        )
+        for position in range(2):
+            image = CustomImage.objects.create(
+                title=f"Bowl {i}",
+                file=f"original_images/bowl{i}.jpg",
+                width=10,
+                height=10,
+                item=item,
+            )
+            CustomRendition.objects.create(
+                image=image,
+                filter_spec="max-100x100",
+                file=f"images/bowl{i}.max-100x100.jpg",
+                width=10,
+                height=10,
+            )
+        Item.objects.filter(pk=item.pk).update(image=image)
+    return client
+
+
+def page_queries(client, per_page):
+    url = reverse("item_list") + f"?archive=&per_page={per_page}"
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    assert response.status_code == 200
+    assert response.content.count(b"bowl") >= per_page
+    return len(queries)
+
+
+def test_item_list_query_budget(items):
+    # Every column is visible by default; the first request saves the settings
+    page_queries(items, ROWS[0])
+    counts = {per_page: page_queries(items, per_page) for per_page in ROWS}
+    assert len(set(counts.values())) == 1, counts
+    assert counts[ROWS[0]] <= 10
+
+
+def test_visible_columns_are_worked_out_once(db, monkeypatch):
+    calls = []
+    define_columns = item_views.define_columns
+    monkeypatch.setattr(
+        item_views,
+        "define_columns",
+        lambda table, width: calls.append(width) or define_columns(table, width),
+    )
+    request = RequestFactory().get(reverse("item_list"))
+    SessionMiddleware(lambda r: None).process_request(request)
+    view = ItemTableView()
+    view.setup(request)
+    view.width = 0
+    view.get_queryset()
+    view.get_queryset()
+    assert len(calls) == 1
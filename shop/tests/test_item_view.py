@@ -0,0 +1,167 @@
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from coderedcms.models import LayoutSettings
+from wagtail.models import Collection, Locale, Page, Site
+from shop import renditions
+from shop.models import (
+    Book,
+    Category,
+    CustomImage,
+    CustomRendition,
+    GlobalSettings,
+    HostPage,
+    Item,
+)
+
+
+@pytest.fixture
+def item_page(db, settings):
+    settings.STORAGES = {
+        **settings.STORAGES,
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+        },
+    }
+    cache.clear()
+    GlobalSettings.objects.create(pk=1)
+    Locale.objects.get_or_create(language_code="en")
+    root = Page.add_root(title="Root", slug="root")
+    root.add_child(instance=HostPage(title="Host", slug="host-page"))
+    Site.objects.create(hostname="testserver", root_page=root, is_default_site=True)
+    if not Collection.get_first_root_node():
+        Collection.add_root(name="Root")
+    catalogue = Category.add_root(name="Catalogue")
+    catalogue.post_save()
+    item = Item.objects.create(
+        name="Bowl",
+        ref="A1",
+        slug="bowl",
+        category=Category.objects.get(pk=catalogue.pk),
+        description="A **fine** bowl",
+    )
+    return reverse("public_item", kwargs={"ref": "A1", "slug": "bowl"}), item
+
+
+def image_queries(client, url):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    assert response.status_code == 200
+    return response, [q for q in queries if "shop_customimage" in q["sql"]]
+
+
+def test_item_page_is_cached(client, item_page):
+    url, item = item_page
+    client.get(url)
+    response, queries = image_queries(client, url)
+    assert b"fine" in response.content
+    assert queries == []
+
+
+def test_item_save_invalidates_page(client, item_page):
+    url, item = item_page
+    client.get(url)
+    item.description = "A **rare** bowl"
+    item.save()
+    response, queries = image_queries(client, url)
+    assert b"rare" in response.content
+    assert queries
+
+
+def test_bulk_update_invalidates_page(client, item_page):
+    url, item = item_page
+    assert b"Enquire about this item" in client.get(url).content
+    Item.objects.filter(pk=item.pk).update(archive=True)
+    content = client.get(url).content
+    assert b"Enquire about this item" not in content
+    assert b"Archive item - not for sale" in content
+
+
+def test_image_save_invalidates_page(client, item_page):
+    url, item = item_page
+    client.get(url)
+    CustomImage.objects.create(
+        title="Side view",
+        file="original_images/side.jpg",
+        width=10,
+        height=10,
+        item=item,
+        show=False,
+    )
+    _, queries = image_queries(client, url)
+    assert queries
+
+
+def test_book_save_invalidates_page(client, item_page):
+    url, item = item_page
+    item.book = Book.objects.create(title="Chinese Bowls", author="Gray")
+    item.save()
+    assert b"Chinese Bowls" in client.get(url).content
+    item.book.title = "Chinese Ceramics"
+    item.book.save()
+    assert b"Chinese Ceramics" in client.get(url).content
+    item.book.delete()
+    assert b"Recommended book" not in client.get(url).content
+
+
+def add_grid_items(category, start, stop):
+    """Items with an image that has every rendition the grid pages use"""
+    filter_specs = renditions.specs(renditions.GRID) + [renditions.THUMB]
+    for i in range(start, stop):
+        image = CustomImage.objects.create(
+            title=f"image {i}", file=f"original_images/{i}.jpg", width=10, height=10
+        )
+        CustomRendition.objects.bulk_create(
+            CustomRendition(
+                image=image,
+                filter_spec=spec,
+                file=f"images/{i}.{spec.replace('|', '.')}.jpg",
+                width=10,
+                height=10,
+            )
+            for spec in filter_specs
+        )
+        Item.objects.create(
+            name=f"Vase {i}", ref=f"V{i}", category=category, image=image
+        )
+
+
+def grid_query_counts(client, url, category):
+    """Queries to render a grid page of 1, 12 and 36 items"""
+    add_grid_items(category, 0, 1)
+    # The first request creates the site settings and caches the global ones
+    client.get(url)
+    counts = []
+    added = 1
+    for size in [1, 12, 36]:
+        add_grid_items(category, added, size)
+        added = max(added, size)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        assert response.status_code == 200
+        assert response.content.count(b"Vase ") == size
+        counts.append(len(queries))
+    return counts
+
+
+def test_catalogue_grid_queries_do_not_grow(client, item_page):
+    url, item = item_page
+    vases = Category.objects.get(name="Catalogue").add_child(name="Vases")
+    vases.post_save()
+    vases = Category.objects.get(pk=vases.pk)
+    counts = grid_query_counts(client, vases.get_absolute_url(), vases)
+    assert counts[0] == counts[1] == counts[2]
+
+
+def test_search_grid_queries_do_not_grow(client, item_page, settings):
+    url, item = item_page
+    # The sqlite full text table is only created by migrations
+    settings.WAGTAILSEARCH_BACKENDS = {
+        "default": {"BACKEND": "wagtail.search.backends.database.fallback"}
+    }
+    LayoutSettings.objects.create(site=Site.objects.get(), search_num_results=36)
+    catalogue = Category.objects.get(name="Catalogue")
+    counts = grid_query_counts(client, reverse("crx_search") + "?s=vase", catalogue)
+    assert counts[0] == counts[1] == counts[2]
@@ -1,5 +1,24 @@
 import pytest
-from shop.models import ItemRef
+import threading
+import time
+from io import StringIO
+from django.core.management import call_command
+from wagtail.models import Collection
+from shop.cache import GLOBAL_SETTINGS, bump_version
+from django.core.cache import cache
+from django.core.signals import request_started
+from django.db import OperationalError, connection
+from shop.cat_tree import tree_move
+from shop.models import (
+    Category,
+    CustomImage,
+    GlobalSettings,
+    Invoice,
+    InvoiceNumber,
+    Item,
+    ItemRef,
+    ShowPrices,
+)
 
 
 def test_itemref_generation(db):
@@ -12,3 +31,212 @@ def test_itemref_generation(db):
     ItemRef.reset(prefix="Q", number=999)
     assert ItemRef.get_next() == "Q999"
     assert ItemRef.increment("Q999") == "Q1000"
+
+
+def test_itemref_batch_reservation(db):
+    ItemRef.reset(prefix="Q", number=998)
+    assert ItemRef.reserve(3) == ["Q998", "Q999", "Q1000"]
+    assert ItemRef.get_next(increment=False) == "Q1001"
+
+
+def test_invoice_numbers_continue_numerically(db):
+    Invoice.objects.create(number="9")
+    Invoice.objects.create(number="10")
+    Invoice.objects.create(number="0", proforma=True)
+    assert Invoice.next_number() == 11
+    assert InvoiceNumber.get_next() == 11
+    assert InvoiceNumber.get_next() == 12
+    assert Invoice.next_number() == 13
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_allocation_is_unique():
+    ItemRef.reset(prefix="Z", number=1)
+    InvoiceNumber.get_next()
+    refs = []
+    numbers = []
+
+    def retry(allocate, *args):
+        # SQLite reports a locked table instead of waiting; nothing is allocated
+        while True:
+            try:
+                return allocate(*args)
+            except OperationalError:
+                time.sleep(0.001)
+
+    def allocate():
+        try:
+            for i in range(10):
+                refs.extend(retry(ItemRef.reserve, 1 + i % 3))
+                numbers.append(retry(InvoiceNumber.get_next))
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=allocate) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(refs) == len(set(refs)) == 6 * 19
+    assert sorted(int(ref[1:]) for ref in refs) == list(range(1, 6 * 19 + 1))
+    assert sorted(numbers) == list(range(2, 62))
+
+
+@pytest.fixture
+def counted_tree(db):
+    root = Category.add_root(name="Catalogue")
+    chinese = root.add_child(name="Chinese")
+    bowls = Category.objects.get(pk=chinese.pk).add_child(name="Bowls")
+    vases = Category.objects.get(pk=chinese.pk).add_child(name="Vases")
+    if not Collection.get_first_root_node():
+        Collection.add_root(name="Root")
+    image = CustomImage.objects.create(
+        title="image", file="original_images/image.jpg", width=10, height=10
+    )
+    return root, chinese, bowls, vases, image
+
+
+def counts(name):
+    category = Category.objects.get(name=name)
+    return category.shop_count, category.archive_count
+
+
+def test_item_save_updates_category_counts(counted_tree):
+    root, chinese, bowls, vases, image = counted_tree
+    item = Item.objects.create(name="Bowl", category=bowls, image=image)
+    Item.objects.create(name="No image", category=bowls)
+    assert counts("Bowls") == (1, 0)
+    assert counts("Chinese") == (1, 0)
+    assert counts("Catalogue") == (1, 0)
+    item.category = vases
+    item.library = Item.Library.ARCHIVE
+    item.save()
+    assert counts("Bowls") == (0, 0)
+    assert counts("Vases") == (0, 1)
+    assert counts("Chinese") == (0, 1)
+    item.delete()
+    assert counts("Catalogue") == (0, 0)
+
+
+def test_bulk_update_updates_category_counts(counted_tree):
+    root, chinese, bowls, vases, image = counted_tree
+    for i in range(3):
+        Item.objects.create(name=f"Bowl {i}", category=bowls, image=image)
+    Item.objects.filter(name="Bowl 0").update(visible=False)
+    assert counts("Chinese") == (2, 0)
+    Item.objects.all().update(category=vases)
+    assert counts("Bowls") == (0, 0)
+    assert counts("Vases") == (2, 0)
+    assert counts("Chinese") == (2, 0)
+
+
+def test_rebuild_counts(counted_tree):
+    root, chinese, bowls, vases, image = counted_tree
+    Item.objects.create(name="Bowl", category=bowls, image=image)
+    Item.objects.create(
+        name="Vase", category=vases, image=image, library=Item.Library.ARCHIVE
+    )
+    Category.objects.update(shop_count=0, archive_count=0)
+    Category.objects.rebuild_counts()
+    assert counts("Catalogue") == (1, 1)
+    assert counts("Bowls") == (1, 0)
+    assert counts("Vases") == (0, 1)
+
+
+def test_tree_move_moves_counts(counted_tree):
+    root, chinese, bowls, vases, image = counted_tree
+    japanese = Category.objects.get(pk=root.pk).add_child(name="Japanese")
+    Item.objects.create(name="Bowl", category=bowls, image=image)
+    Item.objects.create(
+        name="Vase", category=vases, image=image, library=Item.Library.ARCHIVE
+    )
+    tree_move(bowls.id, japanese.id, chinese.id, True)
+    assert counts("Chinese") == (0, 1)
+    assert counts("Japanese") == (1, 0)
+    assert counts("Bowls") == (1, 0)
+    assert counts("Catalogue") == (1, 1)
+
+
+def test_category_delete_removes_counts(counted_tree):
+    root, chinese, bowls, vases, image = counted_tree
+    Item.objects.create(name="Bowl", category=bowls, image=image)
+    Item.objects.create(name="Vase", category=vases, image=image)
+    Category.objects.get(pk=bowls.pk).delete()
+    assert counts("Chinese") == (1, 0)
+    assert counts("Catalogue") == (1, 0)
+
+
+def test_visible_images_uses_stored_file_check(
+    counted_tree, settings, tmp_path, django_assert_num_queries
+):
+    root, chinese, bowls, vases, primary = counted_tree
+    settings.MEDIA_ROOT = tmp_path
+    item = Item.objects.create(name="Bowl", category=bowls, image=primary)
+    other = CustomImage.objects.create(
+        title="other", file="original_images/other.jpg", width=10, height=10
+    )
+    CustomImage.objects.filter(pk=other.pk).update(item=item, file_ok=False)
+    with django_assert_num_queries(2):
+        good, bad = item.visible_images()
+    assert good == [primary]
+    assert bad == [other]
+    # neither file exists on disk
+    good, bad = item.visible_images(check_files=True)
+    assert good == []
+    assert not CustomImage.objects.get(pk=primary.pk).file_ok
+
+
+@pytest.fixture
+def fresh_settings(db):
+    cache.clear()
+    GlobalSettings.invalidate()
+    yield
+    GlobalSettings.invalidate()
+
+
+def test_price_grid_reads_settings_once(fresh_settings, django_assert_max_num_queries):
+    GlobalSettings.objects.create(pk=1, show_prices=ShowPrices.SHOW_EVERYWHERE)
+    items = [Item(name=f"Bowl {i}", sale_price=10 + i) for i in range(36)]
+    with django_assert_max_num_queries(1):
+        prices = [item.display_price() for item in items]
+    assert prices == list(range(10, 46))
+    request_started.send(sender=None)
+    with django_assert_max_num_queries(0):
+        GlobalSettings.record()
+
+
+def test_settings_save_invalidates_cache(fresh_settings):
+    assert GlobalSettings.record().show_prices == ShowPrices.USE_ITEM_SETTINGS
+    rec = GlobalSettings.load()
+    rec.show_prices = ShowPrices.HIDE_EVERYWHERE
+    rec.save()
+    assert GlobalSettings.record().show_prices == ShowPrices.HIDE_EVERYWHERE
+    assert not Item(name="Bowl", sale_price=10).display_price()
+
+
+def test_settings_version_change_reloads_record(fresh_settings):
+    GlobalSettings.objects.create(pk=1, show_prices=ShowPrices.SHOW_EVERYWHERE)
+    GlobalSettings.record()
+    # Another worker saved the settings: only the shared version key changes
+    GlobalSettings.objects.filter(pk=1).update(show_prices=ShowPrices.HIDE_EVERYWHERE)
+    bump_version(GLOBAL_SETTINGS)
+    assert GlobalSettings.record().show_prices == ShowPrices.SHOW_EVERYWHERE
+    request_started.send(sender=None)
+    assert GlobalSettings.record().show_prices == ShowPrices.HIDE_EVERYWHERE
+
+
+def test_description_rendered_on_save(db):
+    item = Item.objects.create(name="Bowl", description="A **fine** bowl")
+    assert item.description_html == "<p>A <strong>fine</strong> bowl</p>"
+    assert item.description_text == "A fine bowl"
+    Item.objects.filter(pk=item.pk).update(description="A *rare* bowl")
+    item.refresh_from_db()
+    assert item.description_text == "A rare bowl"
+
+
+def test_render_descriptions_command(db):
+    item = Item.objects.create(name="Bowl", description="A **fine** bowl")
+    Item.objects.filter(pk=item.pk).update(description_html="", description_text="")
+    call_command("render_descriptions", stdout=StringIO())
+    item.refresh_from_db()
+    assert item.description_text == "A fine bowl"
@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.utils.timezone import now
+from shop.models import OutboundEmail
+from shop.outbox import send_batch
+
+
+class FailingBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionError("SMTP unavailable")
+
+
+def test_queue_and_send(db):
+    for i in range(3):
+        OutboundEmail.queue(f"Subject {i}", "Body", ["a@example.com", "b@example.com"])
+    assert len(mail.outbox) == 0
+    assert send_batch(size=2) == (2, 0)
+    assert send_batch(size=2) == (1, 0)
+    assert send_batch() == (0, 0)
+    assert len(mail.outbox) == 3
+    assert mail.outbox[0].to == ["a@example.com", "b@example.com"]
+    assert not OutboundEmail.pending().exists()
+
+
+def test_failed_message_backs_off(db, settings):
+    settings.EMAIL_BACKEND = "shop.tests.test_outbox.FailingBackend"
+    message = OutboundEmail.queue("Subject", "Body", ["a@example.com"])
+    assert send_batch() == (0, 1)
+    message.refresh_from_db()
+    assert message.attempts == 1
+    assert message.error == "SMTP unavailable"
+    assert message.next_attempt > now()
+    # Not retried until the backoff has passed
+    assert send_batch() == (0, 0)
+    settings.EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+    OutboundEmail.objects.update(next_attempt=now() - timedelta(seconds=1))
+    assert send_batch() == (1, 0)
+    message.refresh_from_db()
+    assert message.sent is not None
+
+
+def test_gives_up_after_max_attempts(db):
+    OutboundEmail.queue("Subject", "Body", ["a@example.com"])
+    OutboundEmail.objects.update(attempts=OutboundEmail.MAX_ATTEMPTS)
+    assert send_batch() == (0, 0)
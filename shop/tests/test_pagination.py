@@ -0,0 +1,89 @@
+import io
+
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.paginator import Paginator
+from wagtail.models import Collection
+from shop.cache import ITEMS, versioned_key
+from shop.management.commands.benchmark_items import BENCHMARK_ITEMS
+from shop.models import GRID_KEYSET, Category, CustomImage, Item
+from shop.pagination import KeysetPaginator
+
+
+@pytest.fixture
+def grid(db):
+    cache.clear()
+    if not Collection.get_first_root_node():
+        Collection.add_root(name="Root")
+    image = CustomImage.objects.create(
+        title="image", file="original_images/image.jpg", width=10, height=10
+    )
+    category = Category.add_root(name="Catalogue")
+    # Plenty of ties and null prices to exercise every column of the keyset
+    for i in range(40):
+        Item.objects.create(
+            name=f"Bowl {i % 7}",
+            category=category,
+            image=image,
+            featured=i % 9 == 0,
+            rank=i % 3,
+            sale_price=None if i % 4 == 0 else (i % 5) * 100,
+        )
+    return Category.objects.get(pk=category.pk)
+
+
+def paginator(category, per_page=6):
+    items = category.shop_items()
+    return KeysetPaginator(items, per_page, GRID_KEYSET, items.count(), category.id)
+
+
+def test_keyset_pages_match_offset_pages(grid):
+    keyset = paginator(grid)
+    offset = Paginator(grid.shop_items(), 6)
+    assert keyset.num_pages == offset.num_pages == 7
+    for number in keyset.page_range:
+        assert list(keyset.page(number)) == list(offset.page(number))
+
+
+def test_deep_page_seeks_without_offset_or_count(grid, django_assert_num_queries):
+    keyset = paginator(grid)
+    keyset.page(2)
+    with django_assert_num_queries(1) as queries:
+        items = list(keyset.page(6))
+    assert len(items) == 6
+    sql = queries.captured_queries[0]["sql"]
+    assert "OFFSET" not in sql and "COUNT" not in sql
+
+
+def test_item_change_refreshes_page_keys(grid):
+    keyset = paginator(grid)
+    before = list(keyset.page(3))
+    first = Item.objects.filter(category=grid).order_by(*GRID_KEYSET.ordering())[0]
+    first.featured = False
+    first.rank = 99
+    first.save()
+    assert list(paginator(grid).page(3)) == list(
+        Paginator(grid.shop_items(), 6).page(3)
+    )
+    assert list(paginator(grid).page(3)) != before
+
+
+def test_benchmark_keeps_its_page_keys_apart(grid):
+    out = io.StringIO()
+    call_command(
+        "benchmark_items",
+        "--seed",
+        "60",
+        "--per-page",
+        "6",
+        "--repeat",
+        "1",
+        "--no-plans",
+        stdout=out,
+    )
+    assert "Seeded 60 items" in out.getvalue()
+    assert Item.objects.count() == 40
+    assert cache.get(versioned_key(BENCHMARK_ITEMS, "pages", "grid", 6)) is not None
+    assert cache.get(versioned_key(ITEMS, "pages", "grid", 6)) is None
+    assert cache.get(versioned_key(ITEMS, "pages", "benchmark", 6)) is None
@@ -0,0 +1,92 @@
+import pytest
+from PIL import Image
+from django.core.cache import cache
+from django.template import Context, Template
+from wagtail.models import Collection
+from shop import renditions
+from shop.management.commands.make_renditions import checkpoint_path
+from shop.models import CustomImage
+
+
+@pytest.fixture
+def image(db, settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    # Wagtail caches renditions by image id, which sqlite reuses between tests
+    cache.clear()
+    (tmp_path / "original_images").mkdir()
+    Image.new("RGB", (1200, 900), "blue").save(tmp_path / "original_images/bowl.jpg")
+    if not Collection.get_first_root_node():
+        Collection.add_root(name="Root")
+    return CustomImage.objects.create(
+        title="Bowl", file="original_images/bowl.jpg", width=1200, height=900
+    )
+
+
+def prefetch(image):
+    """Generate the renditions, as make_renditions does, and fetch them like a view"""
+    image.get_renditions(*renditions.all_specs())
+    return (
+        CustomImage.objects.filter(id=image.id)
+        .prefetch_renditions(*renditions.all_specs())
+        .get()
+    )
+
+
+def render(text, image):
+    return Template("{% load shop_tags %}" + text).render(Context({"image": image}))
+
+
+def test_picture_has_modern_sources_and_jpeg_fallback(image):
+    html = render(
+        '{% picture image "max-1000x1000" class="img-fluid" %}', prefetch(image)
+    )
+    for image_format in renditions.formats():
+        assert f'<source type="image/{image_format}"' in html
+    assert "500w" in html and "750w" in html and "1000w" in html
+    assert 'class="img-fluid"' in html
+    assert ".max-1000x1000.jpg" in html or ".max-1000x1000.jpeg" in html
+
+
+def test_srcset_skips_repeated_widths(image, tmp_path):
+    # Renditions are never enlarged, so both grid widths of a 200 px original match
+    Image.new("RGB", (200, 150), "blue").save(tmp_path / "original_images/small.jpg")
+    small = CustomImage.objects.create(
+        title="Small", file="original_images/small.jpg", width=200, height=150
+    )
+    _, srcsets = renditions.srcsets(prefetch(small), renditions.GRID)
+    assert srcsets["webp"].endswith(" 200w")
+    assert srcsets["webp"].count("w,") == 0
+
+
+def test_picture_data_for_thumbnails(image):
+    html = render('{% picture_data image "max-1000x1000" %}', prefetch(image))
+    assert html.startswith('full="')
+    assert 'data-srcset-webp="' in html
+    assert "500w" in html
+
+
+def test_missing_renditions_are_not_generated(image):
+    html = render('{% picture image "max-1000x1000" %}', image)
+    assert "<source" not in html
+    assert ".max-1000x1000." in html
+    assert list(image.renditions.values_list("filter_spec", flat=True)) == [
+        renditions.DETAIL
+    ]
+
+
+def test_picture_data_clears_missing_formats(image):
+    html = render('{% picture_data image "max-1000x1000" %}', image)
+    assert 'data-srcset-webp=""' in html
+
+
+def test_all_specs_are_unique():
+    specs = renditions.all_specs()
+    assert len(specs) == len(set(specs))
+    assert renditions.ZOOM in specs
+
+
+def test_checkpoint_depends_on_specs_and_images():
+    specs = ["max-100x100", "max-250x250"]
+    assert checkpoint_path(specs, False) == checkpoint_path(specs[::-1], False)
+    assert checkpoint_path(specs, False) != checkpoint_path(specs, True)
+    assert checkpoint_path(specs, False) != checkpoint_path(specs[:1], False)
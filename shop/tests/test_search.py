@@ -0,0 +1,60 @@
+import pytest
+from wagtail.models import Collection
+from shop.filters import ItemFilter
+from shop.models import CustomImage, Item
+from shop.search import PRIORITY, ChainedResults
+
+
+@pytest.fixture
+def priority_items(db):
+    if not Collection.get_first_root_node():
+        Collection.add_root(name="Root")
+    image = CustomImage.objects.create(
+        title="image", file="original_images/image.jpg", width=10, height=10
+    )
+    Item.objects.create(name="Archive no image", archive=True)
+    Item.objects.create(name="Archive image", archive=True, image=image)
+    Item.objects.create(name="Stock no image")
+    Item.objects.create(name="Stock image", image=image)
+
+
+def test_priority_order(priority_items):
+    items = Item.objects.annotate(priority=PRIORITY).order_by("priority")
+    assert [item.name for item in items] == [
+        "Stock image",
+        "Stock no image",
+        "Archive image",
+        "Archive no image",
+    ]
+
+
+def test_chained_results_slices(priority_items):
+    stock = Item.objects.filter(archive=False).order_by("name")
+    archive = Item.objects.filter(archive=True).order_by("name")
+    results = ChainedResults(stock, archive)
+    assert results.count() == 4
+    names = [item.name for item in results[1:3]]
+    assert names == ["Stock no image", "Archive image"]
+    assert results[3].name == "Archive no image"
+    with pytest.raises(IndexError):
+        results[4]
+
+
+def test_chained_results_only_fetch_needed_sources(
+    priority_items, django_assert_num_queries
+):
+    stock = Item.objects.filter(archive=False).order_by("name")
+    archive = Item.objects.filter(archive=True).order_by("name")
+    results = ChainedResults(stock, archive)
+    # One count per source, then only the first source is read
+    with django_assert_num_queries(3):
+        assert len(results[0:2]) == 2
+    with django_assert_num_queries(1):
+        assert len(results[2:4]) == 2
+
+
+def test_staff_search_filter(priority_items):
+    Item.objects.filter(name="Archive image").update(provenance="Hatcher cargo")
+    data = {"search": "hatcher", "library": "all"}
+    names = [item.name for item in ItemFilter(data, Item.objects.all()).qs]
+    assert names == ["Archive image"]
@@ -1,22 +1,24 @@
 import pytest
-from datetime import datetime
+from datetime import date, datetime
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.test import RequestFactory
 from django.contrib.sessions.middleware import SessionMiddleware
 from django.contrib.auth.models import User
 from mixer.backend.django import mixer
+from shop.serializers import SessionSerializer
 from shop.session import *
-from shop.models import Address, Item, InvoiceCharge, Contact
+from shop.models import Address, Item, InvoiceCharge, InvoiceNumber, Contact
 
 
-@pytest.fixture(name="user_request", scope="session")
-def user_request():
-    class Request:
-        def __init__(self):
-            self.request = RequestFactory().get("/")
-            SessionMiddleware().process_request(self.request)
-            # self.request.session.save()
-
-    return Request()
+@pytest.fixture
+def request_(db):
+    cache.clear()
+    request = RequestFactory().get("/")
+    SessionMiddleware(lambda r: None).process_request(request)
+    request.user = User.objects.create_user("staff")
+    return request
 
 
 @pytest.fixture
@@ -25,78 +27,174 @@ def set_up(db):
     mixer.blend(Contact, company="contact_one", main_address=address1, pk=1)
     address2 = mixer.blend(Address, pk=2)
     mixer.blend(Contact, company="contact_two", main_address=address2, pk=2)
-    mixer.blend(Item, name="Item_one", sale_price=Decimal(100), pk=1)
-    mixer.blend(Item, name="Item_two", sale_price=Decimal(200), pk=2)
-    mixer.blend(Item, name="Item_three", sale_price=Decimal(300), pk=3)
+    Item.objects.create(name="Item_one", sale_price=Decimal(100), pk=1)
+    Item.objects.create(name="Item_two", sale_price=Decimal(200), pk=2)
+    Item.objects.create(name="Item_three", sale_price=Decimal(300), pk=3)
 
 
 class TestSessions:
-    def test_session_is_empty(self, user_request):
-        request = user_request.request
-        cart_clear(request)
-        assert len(cart_items(request)) == 0
-        assert len(cart_charges(request)) == 0
-
-    def test_add_get_remove_items(self, user_request, set_up):
-        request = user_request.request
+    def test_session_is_empty(self, request_):
+        cart_clear(request_)
+        assert len(cart_items(request_)) == 0
+        assert len(cart_charges(request_)) == 0
+        assert cart_count(request_) == 0
+
+    def test_add_get_remove_items(self, request_, set_up):
         item = Item.objects.get(pk=1)
-        cart_add_item(request, item)
+        cart_add_item(request_, item)
         assert item.state == Item.State.RESERVED
         item = Item.objects.get(pk=2)
-        cart_add_item(request, item)
+        cart_add_item(request_, item)
         item = Item.objects.get(pk=3)
-        cart_add_item(request, item)
-        assert len(cart_items(request)) == 3
-        item = cart_get_item(request, pk=2)
+        cart_add_item(request_, item)
+        assert len(cart_items(request_)) == 3
+        item = cart_get_item(request_, pk=2)
         assert item.name == "Item_two"
-        cart_remove_item(request, pk=2)
-        assert item.state == Item.State.ON_SALE
-        assert len(cart_items(request)) == 2
-        item = cart_get_item(request, pk=2)
+        assert item.agreed_price == Decimal(200)
+        cart_remove_item(request_, pk=2)
+        assert Item.objects.get(pk=2).state == Item.State.ON_SALE
+        assert len(cart_items(request_)) == 2
+        item = cart_get_item(request_, pk=2)
         assert item is None
 
-    def test_add_get_remove_charges(self, user_request, db):
-        request = user_request.request
-        cart_clear(request)
-        cart_add_charge(request, mixer.blend(InvoiceCharge, amount=Decimal(20)))
-        charge = InvoiceCharge(pk=1, amount=Decimal(20))
-        cart_add_charge(request, charge)
-        cart_add_charge(request, mixer.blend(InvoiceCharge, amount=Decimal(20)))
-        assert len(cart_charges(request)) == 3
-        charge = cart_get_charge(request, pk=1)
-        assert charge.amount == Decimal(20)
-        cart_remove_charge(request, pk=1)
-        assert len(cart_charges(request)) == 2
-        charge = cart_get_charge(request, 1)
-        assert charge is None
-
-    def test_can_add_and_get_buyer(self, user_request, set_up):
-        request = user_request.request
-        cart_clear(request)
+    def test_agreed_price_is_kept_on_line(self, request_, set_up):
+        cart_add_item(request_, Item.objects.get(pk=1))
+        cart_set_price(request_, 1, Decimal(80))
+        assert cart_get_item(request_, 1).agreed_price == Decimal(80)
+        assert Item.objects.get(pk=1).sale_price == Decimal(100)
+
+    def test_add_get_remove_charges(self, request_):
+        cart_add_charge(request_, mixer.blend(InvoiceCharge, amount=Decimal(20)))
+        charge = mixer.blend(InvoiceCharge, amount=Decimal(20))
+        cart_add_charge(request_, charge)
+        cart_add_charge(request_, charge)
+        cart_add_charge(request_, mixer.blend(InvoiceCharge, amount=Decimal(20)))
+        assert len(cart_charges(request_)) == 3
+        assert cart_get_charge(request_, pk=charge.pk).amount == Decimal(20)
+        cart_remove_charge(request_, pk=charge.pk)
+        assert len(cart_charges(request_)) == 2
+        assert cart_get_charge(request_, charge.pk) is None
+
+    def test_can_add_and_get_buyer(self, request_, set_up):
         buyer = Contact.objects.get(pk=1)
-        cart_add_buyer(request, buyer)
-        assert cart_get_buyer(request) == buyer
+        cart_add_buyer(request_, buyer)
+        assert cart_get_buyer(request_) == buyer
         buyer2 = Contact.objects.get(pk=2)
-        cart_add_buyer(request, buyer2)
-        assert cart_get_buyer(request) == buyer2
-
-    def test_invoice_creation_and_reverse(self, user_request, set_up):
-        request = user_request.request
-        cart_clear(request)
-        cart_add_item(request, Item.objects.get(pk=1))
-        cart_add_item(request, Item.objects.get(pk=2))
-        cart_add_item(request, Item.objects.get(pk=3))
-        cart_add_charge(request, mixer.blend(InvoiceCharge, amount=Decimal(20)))
+        cart_add_buyer(request_, buyer2)
+        assert cart_get_buyer(request_) == buyer2
+
+    def test_invoice_creation_and_reverse(self, request_, set_up):
+        cart_add_item(request_, Item.objects.get(pk=1))
+        cart_add_item(request_, Item.objects.get(pk=2))
+        cart_add_item(request_, Item.objects.get(pk=3))
+        cart_add_charge(request_, mixer.blend(InvoiceCharge, amount=Decimal(20)))
         buyer = Contact.objects.get(pk=1)
-        cart_add_buyer(request, buyer)
+        cart_add_buyer(request_, buyer)
         date = datetime(2019, 12, 19)
-        inv = cart_session_to_invoice(request, date)
+        inv = cart_session_to_invoice(request_, date)
         assert inv.total == Decimal(620)
         assert inv.proforma == False
         assert inv.buyer == buyer
         for item in inv.item_set.all():
             assert item.state == Item.State.SOLD
-        cart_invoice_to_session(request, inv)
-        assert len(cart_items(request)) == 3
-        assert len(cart_charges(request)) == 1
-        assert cart_get_buyer(request) == buyer
+        assert cart_count(request_) == 0
+        Item.objects.filter(pk=1).update(sale_price=None)
+        cart_invoice_to_session(request_, inv)
+        assert len(cart_items(request_)) == 3
+        assert len(cart_charges(request_)) == 1
+        assert cart_get_buyer(request_) == buyer
+        assert Item.objects.get(pk=1).sale_price == 0
+
+    def test_items_and_count_queries(self, request_, set_up, django_assert_num_queries):
+        for pk in (1, 2, 3):
+            cart_add_item(request_, Item.objects.get(pk=pk))
+        with django_assert_num_queries(1):
+            assert len(cart_items(request_)) == 3
+        assert cart_count(request_) == 3
+        with django_assert_num_queries(0):
+            assert cart_count(request_) == 3
+
+    def test_deleting_item_clears_count(self, request_, set_up):
+        for pk in (1, 2):
+            cart_add_item(request_, Item.objects.get(pk=pk))
+        assert cart_count(request_) == 2
+        Item.objects.get(pk=1).delete()
+        assert cart_count(request_) == 1
+
+
+def fill_cart(request, size):
+    """Fill the cart with size items and size charges"""
+    cart_clear(request)
+    cache.clear()
+    request._cart = None
+    for i in range(size):
+        cart_add_item(request, Item.objects.create(name=f"Item {i}", sale_price=10))
+        cart_add_charge(request, mixer.blend(InvoiceCharge, amount=Decimal(5)))
+    cart_add_buyer(request, Contact.objects.get(pk=1))
+
+
+def queries(action, request):
+    with CaptureQueriesContext(connection) as context:
+        result = action(request)
+    return len(context), result
+
+
+@pytest.mark.parametrize(
+    "action",
+    [
+        lambda request: cart_session_to_invoice(request, datetime(2024, 1, 1)),
+        lambda request: cart_session_to_invoice(request),
+        cart_empty,
+    ],
+)
+def test_cart_queries_do_not_depend_on_size(request_, set_up, action):
+    # The first invoice number creates the counter row
+    InvoiceNumber.get_next()
+    counts = []
+    for size in (2, 12):
+        fill_cart(request_, size)
+        counts.append(queries(action, request_)[0])
+    assert counts[0] == counts[1]
+
+
+def test_invoice_to_cart_queries_do_not_depend_on_size(request_, set_up):
+    counts = []
+    for size in (2, 12):
+        fill_cart(request_, size)
+        invoice = cart_session_to_invoice(request_)
+        assert invoice.total == size * 15
+        count, _ = queries(
+            lambda request: cart_invoice_to_session(request, invoice), request_
+        )
+        counts.append(count)
+        assert len(cart_items(request_)) == size
+        assert len(cart_charges(request_)) == size
+        assert cart_count(request_) == size
+    assert counts[0] == counts[1]
+
+
+def test_serializer_round_trip():
+    serializer = SessionSerializer()
+    item = Item(name="Bowl", ref="A1", cost_price=Decimal("12.50"))
+    data = {
+        "cost": Decimal("12.50"),
+        "date": date(2024, 1, 2),
+        "items": [item],
+        "path": "/purchase/",
+    }
+    result = serializer.loads(serializer.dumps(data))
+    assert result["cost"] == Decimal("12.50")
+    assert result["date"] == date(2024, 1, 2)
+    assert result["path"] == "/purchase/"
+    assert result["items"][0].name == "Bowl"
+    assert result["items"][0].cost_price == Decimal("12.50")
+    assert result["items"][0].pk is None
+
+
+def test_serializer_only_rebuilds_allowed_models():
+    serializer = SessionSerializer()
+    data = b'{"user":{"__model__":"auth.user","fields":{"is_superuser":true}}}'
+    with pytest.raises(ValueError):
+        serializer.loads(data)
+    contact = serializer.loads(serializer.dumps(Contact(first_name="Ann")))
+    assert contact.first_name == "Ann"
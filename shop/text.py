@@ -0,0 +1,21 @@
+"""
+Renderings of the Markdown used in item descriptions
+Item stores both so pages never parse Markdown while serving a request
+"""
+
+import markdown
+from bs4 import BeautifulSoup
+from markdownify.templatetags.markdownify import markdownify
+
+
+def markdown_html(text):
+    """Sanitised HTML, as produced by the markdownify template filter"""
+    return markdownify(text) if text else ""
+
+
+def markdown_text(text):
+    """Plain text with the Markdown formatting removed"""
+    if not text:
+        return ""
+    soup = BeautifulSoup(markdown.markdown(text), features="html.parser")
+    return soup.get_text()
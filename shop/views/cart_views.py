@@ -19,6 +19,7 @@ from shop.session import (
     cart_empty,
     cart_clear,
     cart_get_item,
+    cart_set_price,
     cart_charges,
     cart_add_charge,
     cart_remove_charge,
@@ -82,19 +83,15 @@ class CartPriceView(LoginRequiredMixin, AjaxCrudView):
         )
 
     def get_object(self, **kwargs):
-        # get object from session
+        # get item with its agreed price from the cart
         pk = kwargs.get("pk", None)
         self.object = cart_get_item(self.request, pk)
-        if not hasattr(self.object, "agreed_price"):
-            self.object.agreed_price = self.object.sale_price
         return self.object
 
     def save_object(self, **kwargs):
-        # save object to session
+        # save agreed price on the cart line
         pk = kwargs.get("pk", None)
-        item = cart_get_item(self.request, pk)
-        item.agreed_price = self.form.cleaned_data["agreed_price"]
-        self.request.session.modified = True
+        cart_set_price(self.request, pk, self.form.cleaned_data["agreed_price"])
         super().save_object(**kwargs)
 
     def get_context_data(self):
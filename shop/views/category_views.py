@@ -4,6 +4,7 @@ from django.shortcuts import redirect, reverse
 from django.urls import reverse_lazy
 from django.views.generic import CreateView, DetailView, TemplateView, UpdateView, View
 from django.templatetags.static import static
+from shop.cache import CATEGORY_TREE, bump_version
 from shop.cat_tree import tree_json, tree_move
 from shop.forms import CategoryForm
 from shop.models import Category, Item
@@ -78,7 +79,10 @@ class CategoryUpdateView(LoginRequiredMixin, StackMixin, UpdateView):
         new_parent = Category.objects.get(id=d["parent_category"])
         response = super().form_valid(form)
         if old_parent and old_parent.id != new_parent.id:
+            Category.objects.adjust_counts(self.object.subtree_changes(-1))
             self.object.move(new_parent, "sorted-child")
+            moved = Category.objects.get(id=self.object.id)
+            Category.objects.adjust_counts(moved.subtree_changes(1))
         new_parent.post_save()
         return response
 
@@ -102,6 +106,7 @@ class CategoryTreeView(LoginRequiredMixin, StackMixin, TemplateView):
     def post(self, request):
         if "fix" in request.POST:
             Category.fix_tree()
+            bump_version(CATEGORY_TREE)
             return redirect("category_tree")
         # Ajax response to move node
         p = request.POST
@@ -8,12 +8,13 @@ from shop.models import Contact, Enquiry, Address
 from shop.forms import ContactForm, EnquiryForm
 from shop.tables import ContactTable, ContactTableTwo, EnquiryTable, MailListTable
 from django_tableaux.views import TableauxView, ModalMixin
+from table_manager.export import StreamingExportMixin
 from table_manager.views import FilteredTableView, AjaxCrudView
 from django_tableaux.buttons import Button
 from shop.filters import ContactFilter, EnquiryFilter
 
 
-class ContactListView(LoginRequiredMixin, TableauxView):
+class ContactListView(LoginRequiredMixin, StreamingExportMixin, TableauxView):
     title = "Contacts"
     template_name = "shop/table_wide.html"
     table_class = ContactTable
@@ -42,6 +43,9 @@ class ContactListView(LoginRequiredMixin, TableauxView):
     def get_actions(self):
         return (("delete", "Delete"), ("export", "Export to Excel"))
 
+    def get_export_queryset(self, queryset):
+        return queryset.select_related("main_address")
+
     def handle_action(self, request, action):
         if action == "delete":
             self.selected_objects.delete()
@@ -224,7 +228,7 @@ def contact_lookup(request, pk=None):
     return HttpResponseNotFound
 
 
-class MailListView(LoginRequiredMixin, TableauxView):
+class MailListView(LoginRequiredMixin, StreamingExportMixin, TableauxView):
     model = Contact
     table_class = MailListTable
     table_pagination = {"per_page": 20}
@@ -233,6 +237,9 @@ class MailListView(LoginRequiredMixin, TableauxView):
     def get_queryset(self):
         return Contact.objects.filter(mail_consent=True)
 
+    def get_export_queryset(self, queryset):
+        return queryset.select_related("main_address")
+
     def get_actions(self):
         return [
             ("remove_consent", "Remove mail consent"),
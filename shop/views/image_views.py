@@ -1,31 +1,27 @@
-import getpass
 import logging
 import os
 
-from PIL import Image
-from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render, reverse
 from django.views.generic import DetailView, View
 from django.views.generic.edit import FormMixin
-from django_htmx.http import HttpResponseClientRedirect
-from resizeimage import resizeimage
-from wagtail.models import Collection
+from django_htmx.http import HttpResponseClientRedirect, HttpResponseClientRefresh
 
 from notes.models import Note
+from shop import ingest
 from shop.forms import ImageForm, PhotoForm
 from shop.models import CustomImage, Item, Photo
 
 logger = logging.getLogger(__name__)
 
 
-class BasicUploadView(View):
+class BasicUploadView(LoginRequiredMixin, View):
     template_name = "shop/basic_upload.html"
 
     def get(self, request):
-        photos_list = Photo.objects.all()
+        photos_list = Photo.objects.filter(user=request.user)
         return render(self.request, self.template_name, {"photos": photos_list})
 
     def post(self, request):
@@ -35,8 +31,9 @@ class BasicUploadView(View):
         """
         form = PhotoForm(self.request.POST, self.request.FILES)
         if form.is_valid():
-            photo = form.save()
+            photo = form.save(commit=False)
             photo.title = os.path.split(form.cleaned_data["file"].name)[1]
+            photo.user = request.user
             photo.save()
             data = {"is_valid": True, "name": photo.title, "url": photo.file.url}
         else:
@@ -70,6 +67,8 @@ class ItemImagesView(LoginRequiredMixin, FormMixin, DetailView):
                 request.session["view_unlinked"] = True
             elif self.action == "hide_unlinked":
                 request.session["view_unlinked"] = False
+            if self.action == "progress":
+                return self.progress_response()
             context = {}
             self.add_unlinked_context(context)
             return render(request, "shop/item_images__unlinked.html", context)
@@ -96,17 +95,19 @@ class ItemImagesView(LoginRequiredMixin, FormMixin, DetailView):
         context["note"] = Note.objects.filter(item=self.object).first()
         self.add_linked_context(context)
         self.add_unlinked_context(context)
-        # Clear photos and associated files
-        Photo.objects.all().delete()
-        folder = os.path.join(settings.MEDIA_ROOT, "photos")
-        for filename in os.listdir(folder):
-            file_path = os.path.join(folder, filename)
-            os.unlink(file_path)
+        # Clear photos left over from an earlier upload by this user
+        if not ingest.is_running(self.request.user):
+            ingest.clear_photos(self.request.user)
         return context
 
     def post(self, request, *args, **kwargs):
         self.item = self.get_object()
         if request.htmx:
+            if self.action == "process":
+                crop = "crop" in request.POST
+                limit = int(request.POST["limit"])
+                ingest.queue_ingestion(self.item, request.user, crop, limit)
+                return self.progress_response()
             context = {"item": self.item}
             if request.htmx.trigger == "group":
                 image_ids = request.POST.getlist("image")
@@ -147,7 +148,7 @@ class ItemImagesView(LoginRequiredMixin, FormMixin, DetailView):
                         self.item.save()
 
             elif self.action == "delete_missing":
-                images, bad_images = self.item.visible_images()
+                images, bad_images = self.item.visible_images(check_files=True)
                 for image in bad_images:
                     image.delete()
                 return HttpResponse(
@@ -169,32 +170,26 @@ class ItemImagesView(LoginRequiredMixin, FormMixin, DetailView):
         if "process" in request.POST:
             crop = "crop" in request.POST
             limit = int(request.POST["limit"])
-            self.process_photos(crop, limit)
+            ingest.queue_ingestion(self.item, request.user, crop, limit)
+            messages.info(request, "The photos will be added when they are processed")
         return self.get(request, *args, **kwargs)
 
-    def process_photos(self, crop: bool, limit: int):
-        user = getpass.getuser()
-        collection = Collection.objects.filter(name="Shop images").first()
-        photos = Photo.objects.all()
-        try:
-            for photo in photos:
-                source = os.path.join(settings.MEDIA_ROOT, photo.file.name)
-                with open(source, "r+b") as f:
-                    with Image.open(f) as image:
-                        im = resize(image, crop, limit)
-                        dest = os.path.join("original_images", photo.title)
-                        full_path = os.path.join(settings.MEDIA_ROOT, dest)
-                        im.save(full_path, optimize=True, quality=70)
-                CustomImage.objects.create(
-                    file=dest,
-                    title=self.item.ref + " " + self.item.name,
-                    collection_id=collection.id,
-                    uploaded_by_user=self.request.user,
-                    item=self.item,
-                )
-            return True
-        except PermissionError as e:
-            messages.error(self.request, f"Permission error User:{user}, {full_path}")
+    def add_report(self, job):
+        """Tell staff about skipped duplicates and similar images"""
+        for line in job.report:
+            messages.warning(self.request, line)
+
+    def progress_response(self):
+        """Progress of a queued ingestion; refresh the page when it is done"""
+        progress = ingest.get_progress(self.request.user, self.item)
+        if progress and progress.finished and not progress.error:
+            self.add_report(progress)
+            return HttpResponseClientRefresh()
+        return render(
+            self.request,
+            "shop/item_images__progress.html",
+            {"item": self.item, "progress": progress},
+        )
 
 
 def image_assign_view(request, **kwargs):
@@ -223,37 +218,3 @@ def image_assign_view(request, **kwargs):
             "new_path": reverse("item_images", kwargs={"pk": new_item.pk}),
         }
         return render(request, "shop/image_assign_modal__redirect.html", context)
-
-
-def resize(im, crop, limit):
-    """
-    Resize image to limit if limit > 0
-    if crop_square, and height and width are within 9 % crop to smaller dimension
-    """
-    width = im.width
-    height = im.height
-
-    if width == height:
-        size = width
-        if 0 < limit < width:
-            size = limit
-            im = resizeimage.resize_width(im, size)
-
-    elif width > height:
-        size = height
-        if 0 < limit < height:
-            size = limit
-        if crop and (width - height) / width < 0.09:
-            im = resizeimage.resize_crop(im, [size, size])
-        else:
-            im = resizeimage.resize_width(im, size)
-
-    elif height > width:
-        size = width
-        if limit and width > limit:
-            size = limit
-        if crop and (height - width) / height < 0.09:
-            im = resizeimage.resize_crop(im, [size, size])
-        else:
-            im = resizeimage.resize_height(im, size)
-    return im
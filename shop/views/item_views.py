@@ -2,6 +2,7 @@ import logging
 
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db.models import Count
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse, reverse_lazy
@@ -13,18 +14,19 @@ from shop.forms import ItemCategoriseForm, ItemForm
 from shop.models import Item
 from shop.session import cart_add_item, cart_get_item
 from shop.tables import ItemTable
-from shop.templatetags.shop_tags import unmarkdown
 from shop.truncater import truncate
+from table_manager.export import StreamingExportMixin
 from table_manager.mixins import StackMixin
 
 # from tables_plus.views import TablesPlusView, ModalMixin
 from django_tableaux.buttons import Button
+from django_tableaux.utils import define_columns, load_columns
 from django_tableaux.views import TableauxView
 
 logger = logging.getLogger(__name__)
 
 
-class ItemTableView(LoginRequiredMixin, StackMixin, TableauxView):
+class ItemTableView(LoginRequiredMixin, StackMixin, StreamingExportMixin, TableauxView):
     model = Item
     table_class = ItemTable
     filterset_class = ItemFilter
@@ -38,6 +40,8 @@ class ItemTableView(LoginRequiredMixin, StackMixin, TableauxView):
 
     template_name = "shop/table_wide.html"
     title = "Items"
+    # Relations followed by ItemTable columns
+    column_relations = {"category": "category", "purchased": "lot__purchase"}
 
     def get(self, request, *args, **kwargs):
         self.request.session.pop("referrer", None)
@@ -49,7 +53,33 @@ class ItemTableView(LoginRequiredMixin, StackMixin, TableauxView):
         return initial
 
     def get_queryset(self):
-        return Item.objects.all().order_by("ref")
+        """Fetch what the visible columns need with the page query"""
+        queryset = Item.objects.all().order_by("ref")
+        columns = self.visible_columns()
+        related = [
+            path for column, path in self.column_relations.items() if column in columns
+        ]
+        if related:
+            queryset = queryset.select_related(*related)
+        if "image" in columns:
+            queryset = queryset.with_renditions(ItemTable.thumbnail_spec)
+        if "images" in columns:
+            queryset = queryset.annotate(image_count=Count("images"))
+        return queryset
+
+    def visible_columns(self):
+        """
+        Columns chosen in the user's column settings, else the table defaults
+        Worked out once per request because get_queryset can run several times
+        """
+        if not hasattr(self, "_visible_columns"):
+            table = self.table_class(data=[])
+            define_columns(table, width=self.width)
+            columns = load_columns(self.request, table, width=self.width)
+            self._visible_columns = (
+                columns if columns is not None else table.columns_default
+            )
+        return self._visible_columns
 
     def get_bulk_actions(self):
         return [
@@ -89,7 +119,9 @@ class ItemTableView(LoginRequiredMixin, StackMixin, TableauxView):
         elif "archive_off" in action:
             self.selected_objects.update(archive=False)
         elif "change_category" in action:
-            request.session["selected_objects"] = self.selected_objects
+            request.session["selected_ids"] = list(
+                self.selected_objects.values_list("id", flat=True)
+            )
             # simulate return redirect("item_categorise")
             request.method = "GET"
             return ItemCategoriseModalView.as_view()(request)
@@ -108,7 +140,7 @@ class ItemCategoriseModalView(FormView):
     title = "Change category"
 
     def form_valid(self, form):
-        self.request.session["selected_objects"].update(
+        Item.objects.filter(id__in=self.request.session["selected_ids"]).update(
             category=form.cleaned_data["new_category"]
         )
         return HttpResponseClientRefresh()
@@ -214,7 +246,7 @@ class ItemDetailView(LoginRequiredMixin, StackMixin, DetailView):
             self.object.image if self.object.image in context["images"] else None
         )
         context["in_cart"] = cart_get_item(self.request, self.object.pk)
-        clean_description = unmarkdown(self.object.description).replace("\n", " ")
+        clean_description = self.object.description_text.replace("\n", " ")
         context["seo"] = truncate(clean_description, 200)
         context["note"] = Note.objects.filter(item=self.object).first()
         context["STOCK"] = Item.Library.STOCK.value
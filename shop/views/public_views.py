@@ -1,23 +1,24 @@
 import json
 import logging
 from datetime import datetime
-from itertools import chain
 
-import requests
 from coderedcms.forms import SearchForm
 from coderedcms.models import LayoutSettings
 from django.conf import settings
-from django.core.mail import EmailMessage, get_connection, send_mail
+from django.core.cache import cache
 from django.core.paginator import EmptyPage, InvalidPage, PageNotAnInteger, Paginator
+from django.db import transaction
 from django.http import Http404, HttpResponseBadRequest, HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.functional import SimpleLazyObject
 from django.views.generic import FormView, ListView
 from wagtail.models import Page, Site
 from wagtail.search.backends import get_search_backend
 from wagtail.contrib.search_promotions.models import Query
 from wagtailseo.utils import StructDataEncoder, get_struct_data_images
 
-from shop.cat_tree import Counter
+from shop import captcha, renditions
+from shop.cache import item_key
 from shop.filters import CompilerFilter
 from shop.forms import EnquiryForm, MailListForm
 from shop.models import (
@@ -31,14 +32,19 @@ from shop.models import (
     Item,
     GlobalSettings,
     ContactOptions,
+    OutboundEmail,
+    GRID_KEYSET,
 )
+from shop.pagination import KeysetPaginator
+from shop.search import ChainedResults, search_items
 from shop.tables import BookTable
-from shop.templatetags.shop_tags import unmarkdown
 from shop.truncater import truncate
 from shop.views.legacy_views import legacy_view
 
 logger = logging.getLogger(__name__)
 
+ITEM_CACHE_TIMEOUT = 60 * 60 * 24
+
 
 def home_view(request):
     clear_bad_ip(request)
@@ -48,57 +54,78 @@ def home_view(request):
 
 
 def item_view(request, ref, slug):
-    """Public view of a single object"""
+    """
+    Public view of a single object
+    The rendered item and its SEO data are cached until the item changes
+    """
     template_name = "shop/public/item_detail.html"
     # item = get_object_or_404(Item, ref=ref)
-    item = Item.objects.filter(ref=ref).first()
+    item = Item.objects.filter(ref=ref).select_related("category").first()
     if not item:
         raise Http404
     if not slug and item.slug:
         return redirect("public_item", ref=ref, slug=item.slug)
     if not item.description:
-        item.description = "No description available"
-    clean_description = unmarkdown(item.description).replace("\n", " ")
+        item.description = item.description_text = "No description available"
+        item.description_html = "<p>No description available</p>"
+    key = item_key(item, request.user.is_authenticated)
+    data = cache.get(key)
+    if data is None:
+        data = item_page_data(request, item)
+        cache.set(key, data, ITEM_CACHE_TIMEOUT)
     context = add_page_context(
         request,
         context={},
         path=request.path,
         title=item.name,
-        description=truncate(clean_description, 200),
+        description=data["description"],
     )
     page = context["page"]
     context["item"] = item
-    images, _ = item.visible_images()
-    if images:
-        image = images[0]
-        context["images"] = images
-    else:
-        image = None
+    context["cache_key"] = key
+    context["cache_timeout"] = ITEM_CACHE_TIMEOUT
+    # Only evaluated if the rendered fragment is not in the cache
+    context["images"] = SimpleLazyObject(lambda: item.visible_images()[0])
     if item.category_id:
-        category = get_object_or_404(Category, id=item.category_id)
+        category = item.category
         context["breadcrumb"] = category.breadcrumb_nodes(item_view=True)
         context["category"] = category
-        page.title = f"{category.seo_prefix()} {item.ref}"
+        page.title = f"{category.seo_prefix} {item.ref}"
         # SEO data when category and image exist
-        if image:
-            sd_dict = {
-                "@context": "https://schema.org/",
-                "@type": "Product",
-                "category": category.name,
-                "name": item.name,
-                "description": clean_description,
-                "image": get_struct_data_images(
-                    site=Site.find_for_request(request), image=image
-                ),
-            }
-            page.structured_data = json.dumps(sd_dict, cls=StructDataEncoder)
-            page.og_image = image
+        if data["image"]:
+            page.structured_data = data["structured_data"]
+            page.og_image = data["image"]
     form = EnquiryForm()
     form.fields["subject"].initial = f"Enquiry about {item.ref}"
     context["form"] = form
     return render(request, template_name, context)
 
 
+def item_page_data(request, item):
+    """The expensive parts of an item page, computed on a cache miss"""
+    clean_description = item.description_text.replace("\n", " ")
+    images, _ = item.visible_images()
+    image = images[0] if images else None
+    data = {
+        "description": truncate(clean_description, 200),
+        "image": image,
+        "structured_data": None,
+    }
+    if item.category_id and image:
+        sd_dict = {
+            "@context": "https://schema.org/",
+            "@type": "Product",
+            "category": item.category.name,
+            "name": item.name,
+            "description": clean_description,
+            "image": get_struct_data_images(
+                site=Site.find_for_request(request), image=image
+            ),
+        }
+        data["structured_data"] = json.dumps(sd_dict, cls=StructDataEncoder)
+    return data
+
+
 def catalogue_view(request, slugs=None, archive=False):
     clear_bad_ip(request)
     slug = "catalogue"
@@ -117,7 +144,7 @@ def catalogue_view(request, slugs=None, archive=False):
     )
     page = context["page"]
     prefix = "Archive of" if archive else "Catalogue of"
-    page.title = f"{prefix} {category.seo_prefix()}"
+    page.title = f"{prefix} {category.seo_prefix}"
     page.og_image = category.image if category.image else None
     context["category"] = category
     context["archive"] = archive
@@ -126,18 +153,24 @@ def catalogue_view(request, slugs=None, archive=False):
     if child_categories:
         # category has sub categories
         template_name = "shop/public/category_grid.html"
-        counter = Counter(category, archive)
-        counter.count()
-        # need to reload after the count
-        context["categories"] = category.get_children().filter(
-            hidden=False, count__gt=0
-        )
+        count_field = "archive_count" if archive else "shop_count"
+        context["categories"] = child_categories.filter(
+            **{f"{count_field}__gt": 0}
+        ).with_renditions("width-250")
     else:
         # category has objects
         template_name = "shop/public/item_grid.html"
         objects = category.archive_items() if archive else category.shop_items()
-        context["count"] = objects.count()
-        paginator = Paginator(objects, 36)
+        objects = objects.with_renditions(*renditions.specs(renditions.GRID))
+        if category.is_leaf():
+            count = category.archive_count if archive else category.shop_count
+        else:
+            # Only hidden children, whose items are in the stored count
+            count = objects.count()
+        context["count"] = count
+        paginator = KeysetPaginator(
+            objects, 36, GRID_KEYSET, count, f"{category.id}:{archive}"
+        )
         page_no = request.GET.get("page", 1)
         try:
             page_no = int(page_no)
@@ -215,24 +248,15 @@ def search_view(request, public):
         # get backend
         backend = get_search_backend()
 
-        # Custom search code
-        items_1 = Item.objects.filter(image__isnull=False, archive=False)
-        items_3 = Item.objects.filter(image__isnull=False, archive=True)
-        items_2 = Item.objects.filter(image__isnull=True, archive=False)
-        items_4 = Item.objects.filter(image__isnull=True, archive=True)
+        # Items in priority order, then pages, fetched a page at a time
+        items = Item.objects.with_renditions("max-100x100")
         if public:
-            items_1 = items_1.filter(visible=True)
-            items_2 = items_2.filter(visible=True)
-            items_3 = items_3.filter(visible=True)
-            items_4 = items_4.filter(visible=True)
-        results_1 = backend.search(search_query, items_1)
-        results_2 = backend.search(search_query, items_2)
-        results_3 = backend.search(search_query, items_3)
-        results_4 = backend.search(search_query, items_4)
-        results_page = backend.search(search_query, Page)
-        results = list(chain(results_1, results_2, results_3, results_4, results_page))
+            items = items.filter(visible=True)
+        results = ChainedResults(
+            search_items(search_query, items), backend.search(search_query, Page)
+        )
         # paginate results
-        if results:
+        if results.count():
             paginator = Paginator(
                 results, LayoutSettings.for_request(request).search_num_results
             )
@@ -331,20 +355,10 @@ class CaptchaHoneyPotMixin:
 
     def is_captcha_valid(self):
         option = self.global_settings.record().contact_options
-        if option == ContactOptions.USE_HCAPTCHA:
-            values = {
-                "secret": settings.HCAPTCHA_SECRET_KEY,
-                "response": self.request.POST.get("h-captcha-response"),
-            }
-            url = "https://hcaptcha.com/siteverify"
-        elif option == ContactOptions.USE_RECAPTCHA:
-            values = {
-                "secret": settings.GOOGLE_RECAPTCHA_SECRET_KEY,
-                "response": self.request.POST.get("g-recaptcha-response"),
-            }
-            url = "https://www.google.com/recaptcha/api/siteverify"
-        if option in (ContactOptions.USE_HCAPTCHA, ContactOptions.USE_RECAPTCHA):
-            return requests.post(url, values).json()["success"]
+        if option in captcha.PROVIDERS:
+            token = self.request.POST.get(captcha.response_field(option))
+            ip = get_client_ip(self.request)
+            return captcha.get_client().verify(option, token, ip)
         return True
 
     def captcha_invalid(self, form):
@@ -430,8 +444,12 @@ def is_same_bad_ip(request):
     return client_ip == bad_ip
 
 
+@transaction.atomic
 def process_contact_response(request, data, mail_list):
-    """Mail list is True if it is just a request to add to the mail list"""
+    """
+    Mail list is True if it is just a request to add to the mail list
+    Messages are queued in the outbox and sent by the send_outbox command
+    """
     clear_bad_ip(request)
     contact = Contact.objects.filter(main_address__email=data["email"]).first()
     if not "phone" in data.keys():
@@ -457,12 +475,10 @@ def process_contact_response(request, data, mail_list):
     contact.save()
     if mail_list:
         # Confirm to customer
-        send_mail(
+        OutboundEmail.queue(
             "Confirmation from chinese-porcelain-art.com",
             "You have been added to our mail list",
-            settings.DEFAULT_FROM_EMAIL,
             [contact.main_address.email],
-            fail_silently=False,
         )
         return None
     # item enquiry or general message
@@ -475,35 +491,19 @@ def process_contact_response(request, data, mail_list):
         subject=data["subject"], message=data["message"], contact=contact, item=item
     )
     # Inform staff
-    send_mail(
+    OutboundEmail.queue(
         f"{data['subject']}",
         f"From {data['email']}\n{data['message']}",
-        settings.DEFAULT_FROM_EMAIL,
         [settings.INFORM_EMAIL],
-        fail_silently=False,
     )
-    # connection = get_connection(
-    #     fail_silently=False,
-    # )
-    # email = EmailMessage(
-    #     subject=data["subject"],
-    #     body=data["message"],
-    #     from_email=data["email"],
-    #     to=[settings.INFORM_EMAIL],
-    #     reply_to=[data["email"]],
-    #     connection=connection,
-    # )
-    # email.send(fail_silently=False)
 
     message = "Thank you for your enquiry. We will respond as soon as possible."
     if data["mail_consent"]:
         message += "\nYou have been added to our mail list."
     # Confirm to customer
-    send_mail(
+    OutboundEmail.queue(
         "Confirmation from chinese-porcelain-art.com",
         message,
-        settings.DEFAULT_FROM_EMAIL,
         [contact.main_address.email],
-        fail_silently=False,
     )
     return enquiry
@@ -39,7 +39,7 @@ class PurchaseStartView(View):
 
     def get(self, request):
         session.clear_data(request)
-        request.session["ref"] = ItemRef.get_next(request)
+        request.session["ref"] = ItemRef.get_next(increment=False)
         return redirect("purchase_vendor", 0)
 
 
@@ -240,18 +240,21 @@ class PurchaseSummaryCreateView(LoginRequiredMixin, DispatchMixin, TemplateView)
     @classmethod
     def allocate_refs(cls, request, permanent=False):
         # allocate references across all lots stored in the session
-        ref = ItemRef.get_next(increment=False) if permanent else request.session["ref"]
-        i = 2
-        while i <= session.last_index(request):
-            data = session.get_data(i, request)
-            for item in data["items"]:
-                item.ref = ref
-                ref = (
-                    ItemRef.get_next(increment=True)
-                    if permanent
-                    else ItemRef.increment(ref)
-                )
-            i += 1
+        lots = [
+            session.get_data(i, request)
+            for i in range(2, session.last_index(request) + 1)
+        ]
+        items = [item for data in lots if data for item in data["items"]]
+        if permanent:
+            # Reserve all the refs in one step so concurrent purchases cannot clash
+            refs = ItemRef.reserve(len(items))
+        else:
+            refs = [request.session["ref"]]
+            while len(refs) < len(items):
+                refs.append(ItemRef.increment(refs[-1]))
+        for item, ref in zip(items, refs):
+            item.ref = ref
+        request.session.modified = True
 
     @classmethod
     def set_message(cls, request, remaining):
@@ -50,7 +50,7 @@ class GlobalSettingsView(UpdateView):
     form_class = GlobalSettingsForm
 
     def get_object(self):
-        return GlobalSettings.record()
+        return GlobalSettings.load()
 
     def get_success_url(self) -> str:
         return reverse("staff_home")
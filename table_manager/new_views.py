@@ -8,6 +8,7 @@ from django_tables2 import SingleTableMixin
 from django_tables2.export.views import ExportMixin
 
 from table_manager.buttons import Button
+from table_manager.export import StreamingExportMixin
 from table_manager.session import (
     save_columns,
     load_columns,
@@ -19,7 +20,9 @@ from table_manager.session import (
 logger = logging.getLogger(__name__)
 
 
-class ExtendedTableView(ExportMixin, SingleTableMixin, FilterView):
+class ExtendedTableView(
+    StreamingExportMixin, ExportMixin, SingleTableMixin, FilterView
+):
     template_name = "table_manager/generic_table.html"
     filter_template_name = "table_manager/htmx_filter.html"
     columns_template_name = "table_manager/htmx_columns.html"
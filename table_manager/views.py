@@ -11,13 +11,14 @@ from django_tables2 import SingleTableView
 from django_tables2.export.views import ExportMixin
 from django.utils.html import mark_safe
 from table_manager.buttons import AjaxButton
+from table_manager.export import StreamingExportMixin
 from table_manager.session import debug_stack, new_stack, pop, push
 from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
 
-class FilteredTableView(ExportMixin, SingleTableView):
+class FilteredTableView(StreamingExportMixin, ExportMixin, SingleTableView):
     """
     Generic view for django tables 2 with filter
     http://www.craigderington.me/django-generic-listview-with-django-filters-and-django-tables2/